@@ -0,0 +1,81 @@
+import os
+import uuid
+import wave
+
+import numpy as np
+
+from errors import PipelineError
+from tools import run_tool
+
+SAMPLE_RATE = 16000
+AUDIO_CACHE_DIR = os.path.join("cache", "audio")
+# Bật VAD để whisper bỏ qua đoạn im lặng / chỉ có nhạc
+VAD_FILTER = os.environ.get("WHISPER_VAD", "1") != "0"
+VAD_PARAMETERS = {"min_silence_duration_ms": 500}
+# ffmpeg/ffprobe treo quá bấy nhiêu giây thì bị kill
+FFMPEG_TIMEOUT = int(os.environ.get("FFMPEG_TIMEOUT", "3600"))
+FFPROBE_TIMEOUT = int(os.environ.get("FFPROBE_TIMEOUT", "30"))
+os.makedirs(AUDIO_CACHE_DIR, exist_ok=True)
+
+
+def audio_path(sha256: str) -> str:
+    return os.path.join(AUDIO_CACHE_DIR, f"{sha256}.wav")
+
+
+def prepare_audio(input_path: str, sha256: str, on_progress=None, cancel=None) -> str:
+    """Tách audio 16 kHz mono PCM một lần cho mỗi nội dung, lần sau dùng lại file đã cache.
+
+    on_progress(giây đã xử lý) được gọi theo tiến độ ffmpeg; cancel (threading.Event) để hủy giữa chừng.
+    """
+    path = audio_path(sha256)
+    if os.path.exists(path):
+        return path
+
+    # ffmpeg đọc/ghi theo luồng, bỏ qua hình (-vn) nên không phải giải mã video
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    cmd = [
+        "ffmpeg", "-nostdin", "-loglevel", "error", "-y",
+        "-progress", "pipe:1", "-nostats",
+        "-i", input_path,
+        "-vn", "-ac", "1", "-ar", str(SAMPLE_RATE), "-c:a", "pcm_s16le",
+        "-f", "wav", tmp
+    ]
+
+    def on_line(line: str):
+        # -progress ghi từng dòng key=value; out_time_us là vị trí đã xử lý (micro giây)
+        key, _, value = line.partition("=")
+        if on_progress is not None and key == "out_time_us" and value.isdigit():
+            on_progress(int(value) / 1e6)
+
+    try:
+        run_tool(cmd, FFMPEG_TIMEOUT, on_line, cancel)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return path
+
+
+def probe_duration(path: str) -> float:
+    """Thời lượng media theo header container (ffprobe), không giải mã; None nếu không đọc được."""
+    cmd = ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", path]
+    try:
+        return float(run_tool(cmd, FFPROBE_TIMEOUT).strip())
+    except (OSError, PipelineError, ValueError):
+        return None
+
+
+def audio_duration(path: str) -> float:
+    # Đọc từ header wav, không phải nạp dữ liệu
+    with wave.open(path, "rb") as f:
+        return f.getnframes() / f.getframerate()
+
+
+def load_audio(path: str, start: int = 0, end: int = None) -> np.ndarray:
+    """Đọc file wav đã chuẩn bị (hoặc đoạn mẫu [start, end)) thành mảng float32 mà faster-whisper nhận trực tiếp."""
+    with wave.open(path, "rb") as f:
+        total = f.getnframes()
+        end = total if end is None else min(end, total)
+        f.setpos(min(start, total))
+        frames = f.readframes(max(0, end - start))
+    return np.frombuffer(frames, dtype=np.int16).astype(np.float32) / 32768.0
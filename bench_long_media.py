@@ -0,0 +1,48 @@
+import sys
+import time
+
+from faster_whisper.audio import decode_audio
+
+from audio_prep import SAMPLE_RATE
+from cpu_pool import shutdown
+from long_media import plan_chunks, transcribe_parallel
+
+# Đo tốc độ nhận dạng song song theo số chunk:
+#   python bench_long_media.py <media_path> [1,2,4,8]
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python bench_long_media.py <media_path> [chunk_counts]")
+        return
+
+    audio = decode_audio(sys.argv[1], sampling_rate=SAMPLE_RATE)
+    duration = len(audio) / SAMPLE_RATE
+    counts = [int(n) for n in (sys.argv[2] if len(sys.argv) > 2 else "1,2,4,8").split(",")]
+
+    baseline = None
+    print(f"audio: {duration:.1f}s")
+    print(f"{'chunks':>6} {'planned':>7} {'seconds':>8} {'speedup':>7} {'segments':>8}")
+    for count in counts:
+        chunk_seconds = duration / count
+        planned = len(plan_chunks(audio, chunk_seconds))
+
+        # Khởi động trước các tiến trình con + nạp model để không tính vào thời gian đo
+        warmup, info = transcribe_parallel(audio[:count * 10 * SAMPLE_RATE], chunk_seconds=10, workers=count,
+                                           first_chunk_seconds=10)
+        for _ in warmup:
+            pass
+
+        # Truyền sẵn ngôn ngữ đã nhận ra: không thì chunk đầu (1/count audio) phải chạy một mình để dò ngôn ngữ
+        started = time.perf_counter()
+        generator, _ = transcribe_parallel(audio, chunk_seconds=chunk_seconds, workers=count,
+                                           language=info["language"], first_chunk_seconds=chunk_seconds)
+        segments = sum(1 for _ in generator)
+        elapsed = time.perf_counter() - started
+        baseline = baseline or elapsed
+        print(f"{count:>6} {planned:>7} {elapsed:>8.1f} {baseline / elapsed:>6.2f}x {segments:>8}")
+    shutdown()
+
+
+if __name__ == "__main__":
+    main()
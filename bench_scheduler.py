@@ -0,0 +1,96 @@
+import random
+import statistics
+import sys
+import threading
+import time
+
+from jobs import SCHEDULER_AGING_RATE, JobManager
+
+# Đo độ trễ job (từ lúc nhận tới lúc xong) với tải hỗn hợp clip ngắn + bài giảng dài, FIFO so với SJF:
+#   python bench_scheduler.py [số job] [số worker]
+# Hai kịch bản: "burst" gửi mọi job cùng lúc; "stream" gửi một bài giảng dài trước rồi một dòng clip ngắn
+# đến đều đặn (tải hơi vượt năng lực worker) -- SJF thuần bỏ đói job dài, aging thì không.
+# Chi phí giả lập: 1 giây media = TIME_SCALE giây chạy; giả định thật 1 giây media mất REALTIME_FACTOR giây
+# nên tốc độ aging được co lại cùng tỉ lệ
+
+TIME_SCALE = 0.0005
+REALTIME_FACTOR = 0.1
+MIX = [(120, 0.6), (600, 0.25), (5400, 0.15)]
+SHORT_SECONDS = 300
+LONG_SECONDS = 3600
+# Dòng clip ngắn đến nhanh hơn tốc độ xử lý bấy nhiêu lần
+STREAM_LOAD = 1.1
+
+
+def workload(count: int, seed: int = 7) -> list:
+    """Mọi job đến cùng lúc: (giây chờ trước khi gửi, client, giây media)."""
+    rng = random.Random(seed)
+    durations, weights = zip(*MIX)
+    return [(0.0, f"client{rng.randrange(4)}", rng.choices(durations, weights)[0] * rng.uniform(0.8, 1.2))
+            for _ in range(count)]
+
+
+def stream(count: int, workers: int, seed: int = 7) -> list:
+    """Một bài giảng dài đến trước, sau đó count-1 clip ngắn đến đều đặn từ các client khác."""
+    rng = random.Random(seed)
+    short = MIX[0][0]
+    interval = short * TIME_SCALE / workers / STREAM_LOAD
+    return [(0.0, "client0", MIX[-1][0])] + [(interval, f"client{1 + rng.randrange(3)}", short * rng.uniform(0.8, 1.2))
+                                           for _ in range(count - 1)]
+
+
+def run(jobs_spec: list, workers: int, aging_rate: float) -> dict:
+    manager = JobManager({"upload": (workers, len(jobs_spec))}, aging_rate=aging_rate)
+    done = threading.Semaphore(0)
+
+    def fake_job(job, seconds):
+        time.sleep(seconds * TIME_SCALE)
+        done.release()
+        return {}
+
+    # Giữ worker bận trong lúc xếp hàng để thứ tự do scheduler quyết định, không phải thứ tự gửi
+    blockers = [manager.submit("upload", fake_job, 0.2 / TIME_SCALE)[0] for _ in range(workers)]
+    submitted = []
+    for delay, client, seconds in jobs_spec:
+        time.sleep(delay)
+        submitted.append(manager.submit("upload", fake_job, seconds, cost=seconds, client=client)[0])
+    for _ in range(len(blockers) + len(submitted)):
+        done.acquire()
+    time.sleep(0.05)
+    manager.shutdown()
+
+    latencies = {"short": [], "long": [], "all": []}
+    for job, (_, _, seconds) in zip(submitted, jobs_spec):
+        latency = job.finished_at - job.created_at
+        latencies["all"].append(latency)
+        if seconds < SHORT_SECONDS:
+            latencies["short"].append(latency)
+        elif seconds >= LONG_SECONDS:
+            latencies["long"].append(latency)
+    return {name: (statistics.median(values), max(values)) for name, values in latencies.items() if values}
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    schedulers = (
+        ("fifo", float("inf")),
+        ("sjf+aging", SCHEDULER_AGING_RATE * REALTIME_FACTOR / TIME_SCALE),
+        ("sjf", 1e-9),
+    )
+    # Dòng clip ngắn cần đủ dài để vượt thời gian aging của bài giảng
+    scenarios = (("burst", workload(count)), ("stream", stream(count * 3, workers)))
+    print(f"workers: {workers}")
+    print(f"{'scenario':>8} {'jobs':>5} {'scheduler':>10} {'p50 all':>8} {'max all':>8} "
+          f"{'p50 short':>10} {'max short':>10} {'max long':>9}")
+    for scenario, spec in scenarios:
+        for name, aging_rate in schedulers:
+            result = run(spec, workers, aging_rate)
+            (p50_all, max_all), (p50_short, max_short) = result["all"], result["short"]
+            max_long = result["long"][1] if "long" in result else float("nan")
+            print(f"{scenario:>8} {len(spec):>5} {name:>10} {p50_all:>8.2f} {max_all:>8.2f} "
+                  f"{p50_short:>10.2f} {max_short:>10.2f} {max_long:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
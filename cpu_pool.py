@@ -0,0 +1,162 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from errors import PipelineError
+from model_registry import DEFAULT_COMPUTE_TYPE, DEFAULT_MODEL_SIZE, registry
+
+# Việc nặng CPU (whisper, VAD, đọc audio) chạy trong process pool riêng, không chiếm luồng/GIL của web
+CPU_POOL_WORKERS = int(os.environ.get("CPU_POOL_WORKERS", os.environ.get(
+    "LONG_MEDIA_WORKERS", str(max(1, (os.cpu_count() or 1) // 4)))))
+# Số task tối đa trên mỗi worker được nằm trong pool (đang chạy + chờ); vượt thì phía gửi phải đợi
+CPU_POOL_TASKS_PER_WORKER = int(os.environ.get("CPU_POOL_TASKS_PER_WORKER", "2"))
+# Chờ chỗ trống quá lâu thì báo lỗi thay vì treo job
+CPU_POOL_ADMISSION_TIMEOUT = float(os.environ.get("CPU_POOL_ADMISSION_TIMEOUT", "600"))
+# Chừa lõi CPU cho web và hạ độ ưu tiên của tiến trình con để /download, /translate không bị chậm
+CPU_RESERVED_CORES = int(os.environ.get("CPU_RESERVED_CORES", "1"))
+CPU_POOL_NICE = int(os.environ.get("CPU_POOL_NICE", "5"))
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class CpuPoolBusy(PipelineError):
+    pass
+
+
+def _init_worker(model_size: str, compute_type: str, cpu_threads: int):
+    # Mỗi tiến trình con nạp model riêng với số luồng CPU được chia
+    if CPU_POOL_NICE and hasattr(os, "nice"):
+        os.nice(CPU_POOL_NICE)
+    registry.warm(model_size, compute_type, cpu_threads)
+
+
+def _noop():
+    return os.getpid()
+
+
+class CpuPool:
+    """ProcessPoolExecutor (spawn) có giới hạn số task nhận vào."""
+
+    def __init__(self, workers: int, model_size: str, compute_type: str, max_tasks: int = None,
+                 admission_timeout: float = CPU_POOL_ADMISSION_TIMEOUT):
+        self.workers = max(1, workers)
+        self.cpu_threads = max(1, ((os.cpu_count() or 1) - CPU_RESERVED_CORES) // self.workers)
+        self.max_tasks = max(self.workers, max_tasks or self.workers * CPU_POOL_TASKS_PER_WORKER)
+        self.admission_timeout = admission_timeout
+        self._initargs = (model_size, compute_type, self.cpu_threads)
+        self._executor = self._new_executor()
+        self._slots = threading.BoundedSemaphore(self.max_tasks)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.waiting = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+        self.restarts = 0
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=self._initargs,
+        )
+
+    def _executor_submit(self, fn, *args):
+        # Tiến trình con chết (OOM, initializer nạp model lỗi) làm executor hỏng vĩnh viễn: dựng lại một lần
+        executor = self._executor
+        try:
+            return executor.submit(fn, *args)
+        except BrokenProcessPool:
+            with self._lock:
+                if self._executor is executor:
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    self._executor = self._new_executor()
+                    self.restarts += 1
+                executor = self._executor
+            return executor.submit(fn, *args)
+
+    def submit(self, fn, *args):
+        """Gửi task vào pool; pool đầy thì chờ tối đa admission_timeout giây rồi báo CpuPoolBusy."""
+        started = time.monotonic()
+        with self._lock:
+            self.waiting += 1
+        admitted = self._slots.acquire(timeout=self.admission_timeout)
+        with self._lock:
+            self.waiting -= 1
+            if not admitted:
+                self.rejected += 1
+                raise CpuPoolBusy("Process pool đang quá tải")
+            self.in_flight += 1
+            self.wait_seconds += time.monotonic() - started
+        try:
+            future = self._executor_submit(fn, *args)
+        except BaseException:
+            self._done(None)
+            raise
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        with self._lock:
+            self.in_flight -= 1
+            self.completed += 1
+        self._slots.release()
+
+    def warm(self, wait: bool = False):
+        """Khởi động sẵn các tiến trình con (initializer nạp model) trước request đầu tiên.
+
+        wait=True: chờ các tiến trình con sẵn sàng, initializer lỗi thì báo PipelineError ngay lúc khởi động.
+        """
+        futures = [self._executor_submit(_noop) for _ in range(self.workers)]
+        if not wait:
+            return
+        try:
+            for future in futures:
+                future.result()
+        except BrokenProcessPool as e:
+            raise PipelineError("Không khởi động được process pool nhận dạng (nạp model whisper lỗi?)", str(e))
+
+    def stats(self) -> dict:
+        with self._lock:
+            admitted = self.completed + self.in_flight
+            return {
+                "workers": self.workers,
+                "cpu_threads": self.cpu_threads,
+                "max_tasks": self.max_tasks,
+                "in_flight": self.in_flight,
+                "waiting": self.waiting,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "restarts": self.restarts,
+                "avg_wait_ms": round(self.wait_seconds / admitted * 1000, 1) if admitted else 0.0,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def get_pool(workers: int = CPU_POOL_WORKERS, model_size: str = DEFAULT_MODEL_SIZE,
+             compute_type: str = DEFAULT_COMPUTE_TYPE) -> CpuPool:
+    """Một pool cho mỗi cấu hình (số worker, model); mặc định dùng chung cho mọi job."""
+    key = (workers, model_size, compute_type)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = CpuPool(workers, model_size, compute_type)
+        return _pools[key]
+
+
+def stats() -> dict:
+    with _pools_lock:
+        return {f"{w}x{size}/{compute}": pool.stats() for (w, size, compute), pool in _pools.items()}
+
+
+def shutdown():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.shutdown()
+        _pools.clear()
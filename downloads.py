@@ -0,0 +1,162 @@
+import os
+import re
+from email.utils import formatdate, parsedate_to_datetime
+
+import anyio
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response
+
+from precompress import negotiate, variant_path
+
+# Artifact mang id job / sha256 trong tên và không bao giờ bị ghi đè -> cho cache lâu dài
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+CHUNK_SIZE = 64 * 1024
+_RANGE_RE = re.compile(r"^(\d*)-(\d*)$")
+
+
+class FileRangeResponse(Response):
+    """Trả về một đoạn byte của file (206), dùng zero-copy sendfile nếu server ASGI hỗ trợ."""
+
+    def __init__(self, path: str, start: int, end: int, headers: dict, media_type: str):
+        super().__init__(status_code=206, headers=headers, media_type=media_type)
+        self.path = path
+        self.start = start
+        self.end = end
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"] == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        count = self.end - self.start + 1
+        async with await anyio.open_file(self.path, "rb") as f:
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({"type": "http.response.zerocopysend", "file": f.wrapped,
+                            "offset": self.start, "count": count, "more_body": False})
+                return
+            await f.seek(self.start)
+            while count > 0:
+                chunk = await f.read(min(CHUNK_SIZE, count))
+                if not chunk:
+                    break
+                count -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": count > 0})
+            if count > 0:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def parse_range(header: str, size: int):
+    """'bytes=a-b' -> (start, end); None nếu không dùng được, 'invalid' nếu ngoài phạm vi.
+
+    Chỉ hỗ trợ một khoảng; nhiều khoảng thì trả cả file (được phép theo RFC 9110).
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    match = _RANGE_RE.match(spec.strip())
+    # Sai cú pháp (bytes=--5, bytes=-, bytes=a-b...): bỏ qua header Range, trả cả file (RFC 9110 14.1.1)
+    if match is None or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    if first == "":
+        # bytes=-N: N byte cuối
+        length = int(last)
+        if length == 0:
+            return "invalid"
+        start, end = max(0, size - length), size - 1
+    else:
+        start = int(first)
+        end = int(last) if last else size - 1
+        if last and end < start:
+            # bytes=5-2 cũng là sai cú pháp
+            return None
+    if start >= size:
+        return "invalid"
+    return start, min(end, size - 1)
+
+
+class FullFileResponse(FileResponse):
+    """FileResponse luôn trả cả file.
+
+    Starlette >= 0.39 tự đọc Range trong FileResponse (400 cho bytes=5-2, multipart cho nhiều khoảng);
+    Range đã được file_response xử lý hoặc cố ý bỏ qua nên bỏ header này trước khi chuyển tiếp.
+    """
+
+    async def __call__(self, scope, receive, send):
+        headers = [(name, value) for name, value in scope["headers"] if name.lower() != b"range"]
+        await super().__call__({**scope, "headers": headers}, receive, send)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    tags = [t.strip() for t in header.split(",")]
+    # If-None-Match so sánh yếu: bỏ tiền tố W/
+    return "*" in tags or etag in [t[2:] if t.startswith("W/") else t for t in tags]
+
+
+def _not_modified(request: Request, etag: str, mtime: float) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _range_allowed(request: Request, etag: str, mtime: float) -> bool:
+    # If-Range: chỉ trả một đoạn nếu client vẫn giữ đúng phiên bản file
+    if_range = request.headers.get("if-range")
+    if if_range is None:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag
+    try:
+        return int(mtime) <= parsedate_to_datetime(if_range).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+def file_response(request: Request, path: str, filename: str, media_type: str, sha256: str,
+                  encodings=()) -> Response:
+    """FileResponse có ETag mạnh theo hash nội dung, GET có điều kiện (304) và Range (206/416).
+
+    Nếu có bản nén sẵn (encodings) thì chọn theo Accept-Encoding; mỗi bản nén có ETag riêng.
+    """
+    encoding = negotiate(request.headers.get("accept-encoding"), encodings)
+    if encoding:
+        path = variant_path(path, encoding)
+    stat = os.stat(path)
+    etag = f'"{sha256}.{encoding}"' if encoding else f'"{sha256}"'
+    headers = {
+        "etag": etag,
+        "last-modified": formatdate(stat.st_mtime, usegmt=True),
+        "accept-ranges": "bytes",
+        "cache-control": IMMUTABLE_CACHE_CONTROL,
+    }
+    if encodings:
+        headers["vary"] = "Accept-Encoding"
+    if encoding:
+        headers["content-encoding"] = encoding
+
+    if _not_modified(request, etag, stat.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if range_header and _range_allowed(request, etag, stat.st_mtime):
+        byte_range = parse_range(range_header, stat.st_size)
+        if byte_range == "invalid":
+            return Response(status_code=416, headers={**headers, "content-range": f"bytes */{stat.st_size}"})
+        if byte_range is not None:
+            start, end = byte_range
+            return FileRangeResponse(path, start, end, media_type=media_type, headers={
+                **headers,
+                "content-range": f"bytes {start}-{end}/{stat.st_size}",
+                "content-length": str(end - start + 1),
+                "content-disposition": f'inline; filename="{filename}"',
+            })
+
+    return FullFileResponse(path, media_type=media_type, filename=filename, headers=headers, stat_result=stat)
@@ -0,0 +1,10 @@
+class PipelineError(Exception):
+    """Lỗi có thể báo lại cho client (vd. video không có phụ đề)."""
+
+    def __init__(self, message: str, detail: str = None):
+        super().__init__(message)
+        self.detail = detail
+
+
+class JobCancelled(PipelineError):
+    """Job bị hủy (DELETE /jobs/{id}) trong lúc đang chạy."""
@@ -0,0 +1,320 @@
+import heapq
+import itertools
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+
+from errors import JobCancelled, PipelineError
+import storage
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+# Mỗi loại pipeline: (số job chạy cùng lúc, số job được chờ); hàng chờ đầy thì từ chối ngay (429)
+JOB_LIMITS = {
+    "process": (int(os.environ.get("PROCESS_CONCURRENCY", "4")), int(os.environ.get("PROCESS_QUEUE", "32"))),
+    "upload": (int(os.environ.get("UPLOAD_CONCURRENCY", str(JOB_WORKERS))), int(os.environ.get("UPLOAD_QUEUE", "8"))),
+}
+# Chưa có job nào chạy xong thì ước lượng thời gian chạy một job bằng giá trị này khi tính Retry-After
+DEFAULT_JOB_SECONDS = 30
+# Job ngắn chạy trước (SJF theo chi phí ước lượng = số giây media), nhưng mỗi giây chờ bù lại
+# SCHEDULER_AGING_RATE giây chi phí nên job dài không bị bỏ đói
+SCHEDULER_AGING_RATE = float(os.environ.get("SCHEDULER_AGING_RATE", "10"))
+# Chia công bằng giữa các client: chi phí các job client đó đang có trong lane được cộng vào job mới
+FAIR_SHARE = os.environ.get("SCHEDULER_FAIR_SHARE", "1") != "0"
+
+# Job đã xong được giữ lại bấy nhiêu giây để client còn hỏi trạng thái
+JOB_RETENTION = int(os.environ.get("JOB_RETENTION", "3600"))
+
+
+class JobQueueFull(Exception):
+    """Hàng chờ của loại pipeline đã đầy; retry_after là số giây client nên đợi."""
+
+    def __init__(self, kind: str, retry_after: int):
+        super().__init__(f"Hàng chờ {kind} đã đầy")
+        self.kind = kind
+        self.retry_after = retry_after
+
+
+class Job:
+    def __init__(self, kind: str, job_id: str = None):
+        self.id = job_id or str(uuid.uuid4())[:8]
+        self.kind = kind
+        self.cost = 0.0
+        self.client = None
+        # DELETE /jobs/{id} đặt cờ này; pipeline và tiến trình ngoài (tools.run_tool) dừng theo
+        self.cancelled = threading.Event()
+        # Sự kiện tiến độ mới nhất của tiến trình ngoài, vd. {"tool": "ffmpeg", "position": 12.5}
+        self.tool = None
+        self.status = "queued"
+        self.stage = "queued"
+        self.segments_done = 0
+        self.position = 0.0
+        self.duration = None
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        # Cue đã xong (gốc + bản dịch) để client nhận dần qua /jobs/{id}/cues/stream
+        self.cues = []
+        self._lock = threading.Lock()
+
+    def update(self, **fields):
+        with self._lock:
+            for name, value in fields.items():
+                setattr(self, name, value)
+
+    def add_cue(self, start: float, end: float, text: str, translations: dict):
+        with self._lock:
+            self.cues.append({"index": len(self.cues) + 1, "start": round(start, 3), "end": round(end, 3),
+                              "text": text, "translated": translations})
+            self.segments_done = len(self.cues)
+
+    def check_cancelled(self):
+        if self.cancelled.is_set():
+            raise JobCancelled("Job đã bị hủy")
+
+    def cues_since(self, index: int) -> tuple:
+        """(các cue sau vị trí index, job đã kết thúc chưa) lấy cùng lúc để không sót cue cuối."""
+        with self._lock:
+            return self.cues[index:], self.finished_at is not None
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            progress = {"segments_done": self.segments_done, "position": round(self.position, 2),
+                        "duration": self.duration, "tool": self.tool}
+            if self.duration:
+                progress["percent"] = round(min(100.0, self.position / self.duration * 100), 1)
+            return {
+                "job_id": self.id,
+                "kind": self.kind,
+                "status": self.status,
+                "stage": self.stage,
+                "progress": progress,
+                "result": self.result,
+                "error": self.error,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+            }
+
+
+class Lane:
+    """Worker + hàng chờ ưu tiên có giới hạn cho một loại pipeline. Bộ đếm được JobManager khóa.
+
+    Thứ tự chạy: created_at + (chi phí + chi phí đang có của client) / aging_rate, nhỏ chạy trước.
+    Vì độ ưu tiên giảm đều theo thời gian chờ với mọi job nên khóa này cố định, dùng heap được.
+    """
+
+    def __init__(self, kind: str, concurrency: int, queue_size: int, aging_rate: float = SCHEDULER_AGING_RATE,
+                 fair_share: bool = FAIR_SHARE):
+        self.kind = kind
+        self.concurrency = max(1, concurrency)
+        self.queue_size = max(0, queue_size)
+        self.aging_rate = aging_rate
+        self.fair_share = fair_share
+        self._heap = []
+        self._seq = itertools.count()
+        self._ready = threading.Condition()
+        self._closed = False
+        self._client_cost = {}
+        self._threads = [threading.Thread(target=self._work, name=f"job-{kind}-{i}", daemon=True)
+                         for i in range(self.concurrency)]
+        for thread in self._threads:
+            thread.start()
+        self.queued = 0
+        self.running = 0
+        self.rejected = 0
+        self.completed = 0
+        self.wait_seconds = 0.0
+        self.run_seconds = 0.0
+
+    def push(self, job: Job, task):
+        # Gọi khi đang giữ khóa JobManager
+        backlog = self._client_cost.get(job.client, 0.0) if self.fair_share and job.client else 0.0
+        priority = job.created_at + (job.cost + backlog) / self.aging_rate
+        if job.client:
+            self._client_cost[job.client] = backlog + job.cost
+        with self._ready:
+            heapq.heappush(self._heap, (priority, next(self._seq), task))
+            self._ready.notify()
+
+    def finish(self, job: Job):
+        # Gọi khi đang giữ khóa JobManager
+        if job.client in self._client_cost:
+            remaining = self._client_cost[job.client] - job.cost
+            if remaining > 1e-9:
+                self._client_cost[job.client] = remaining
+            else:
+                del self._client_cost[job.client]
+
+    def _work(self):
+        while True:
+            with self._ready:
+                while not self._heap and not self._closed:
+                    self._ready.wait()
+                if self._closed:
+                    return
+                _, _, task = heapq.heappop(self._heap)
+            task()
+
+    def close(self):
+        with self._ready:
+            self._closed = True
+            self._heap.clear()
+            self._ready.notify_all()
+
+    def full(self) -> bool:
+        # queued gồm cả job vừa nhận chưa kịp chạy, nên so với tổng chỗ chạy + chỗ chờ
+        return self.queued + self.running >= self.concurrency + self.queue_size
+
+    def retry_after(self) -> int:
+        # Ước lượng: số "lượt" phải chờ trước khi còn chỗ * thời gian chạy trung bình
+        avg_run = self.run_seconds / self.completed if self.completed else DEFAULT_JOB_SECONDS
+        rounds = max(0, self.queued + self.running - self.concurrency) // self.concurrency + 1
+        return max(1, math.ceil(avg_run * rounds))
+
+    def stats(self) -> dict:
+        started = self.completed + self.running
+        return {
+            "concurrency": self.concurrency,
+            "queue_size": self.queue_size,
+            "queued": self.queued,
+            "running": self.running,
+            "rejected": self.rejected,
+            "completed": self.completed,
+            "avg_wait_seconds": round(self.wait_seconds / started, 2) if started else 0.0,
+            "avg_run_seconds": round(self.run_seconds / self.completed, 2) if self.completed else 0.0,
+            "clients": len(self._client_cost),
+        }
+
+
+class JobManager:
+    """Chạy pipeline nặng trong pool worker giới hạn theo loại, client hỏi trạng thái qua job id."""
+
+    def __init__(self, limits: dict = JOB_LIMITS, aging_rate: float = SCHEDULER_AGING_RATE,
+                 fair_share: bool = FAIR_SHARE):
+        self._lanes = {kind: Lane(kind, concurrency, queue_size, aging_rate, fair_share)
+                       for kind, (concurrency, queue_size) in limits.items()}
+        self._jobs = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.coalesced = 0
+
+    def check_capacity(self, kind: str, key: tuple = None):
+        """Báo JobQueueFull sớm (trước khi nhận file upload) nếu job mới sẽ bị từ chối."""
+        with self._lock:
+            lane = self._lanes[kind]
+            if (key is None or key not in self._inflight) and lane.full():
+                lane.rejected += 1
+                raise JobQueueFull(kind, lane.retry_after())
+
+    def submit(self, kind: str, fn, *args, job_id: str = None, key: tuple = None,
+               cost: float = 0.0, client: str = None) -> tuple:
+        """Trả về (job, coalesced). Cùng key với job đang chạy thì dùng chung job đó.
+
+        Hàng chờ của loại job đầy thì báo JobQueueFull thay vì nhận thêm.
+        cost là chi phí ước lượng (giây media) để xếp lịch; client dùng để chia công bằng.
+        """
+        with self._lock:
+            if key is not None and key in self._inflight:
+                self.coalesced += 1
+                return self._inflight[key], True
+
+            lane = self._lanes[kind]
+            if lane.full():
+                lane.rejected += 1
+                raise JobQueueFull(kind, lane.retry_after())
+            lane.queued += 1
+            job = Job(kind, job_id)
+            job.cost = cost or 0.0
+            job.client = client
+            # File của job đang chạy không bị dọn
+            storage.protect(job.id)
+            self._prune()
+            self._jobs[job.id] = job
+            if key is not None:
+                self._inflight[key] = job
+            self.submitted += 1
+            lane.push(job, lambda: self._run(lane, job, fn, args, key))
+        return job, False
+
+    def _run(self, lane: Lane, job: Job, fn, args, key: tuple):
+        started = time.time()
+        with self._lock:
+            # Job bị hủy khi còn chờ đã được kết thúc ngay trong cancel(): chỉ bỏ qua
+            if job.finished_at is not None:
+                return
+            lane.queued -= 1
+            lane.running += 1
+            lane.wait_seconds += started - job.created_at
+            job.update(status="running", started_at=started)
+        try:
+            job.check_cancelled()
+            result = fn(job, *args)
+            job.update(status="done", stage="done", result=result)
+        except JobCancelled:
+            job.update(status="cancelled", stage="cancelled")
+        except PipelineError as e:
+            job.update(status="error", error={"error": str(e), "detail": e.detail})
+        except Exception as e:
+            logger.exception("Job %s (%s) lỗi không mong đợi", job.id, job.kind)
+            job.update(status="error", error={"error": str(e)})
+        finally:
+            finished = time.time()
+            job.update(finished_at=finished)
+            storage.release(job.id)
+            with self._lock:
+                lane.running -= 1
+                lane.completed += 1
+                lane.run_seconds += finished - started
+                lane.finish(job)
+                # Job đã hủy có thể đã bị job mới cùng key thay chỗ: chỉ xóa nếu key còn là của job này
+                if key is not None and self._inflight.get(key) is job:
+                    del self._inflight[key]
+
+    def _prune(self):
+        cutoff = time.time() - JOB_RETENTION
+        for job_id in [j.id for j in self._jobs.values() if j.finished_at and j.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def cancel(self, job_id: str):
+        """Hủy job đang chờ/đang chạy; job đã dùng chung (coalesced) thì mọi client cùng bị hủy."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished_at is not None:
+                return job
+            job.cancelled.set()
+            # Request giống hệt đến sau phải tạo job mới, không dùng chung job đã hủy
+            for key in [k for k, j in self._inflight.items() if j is job]:
+                del self._inflight[key]
+            if job.started_at is None:
+                # Còn trong hàng chờ: kết thúc luôn (trả chỗ trong lane, bỏ bảo vệ file, đóng stream cue);
+                # worker lấy nó ra khỏi heap sau sẽ bỏ qua
+                lane = self._lanes[job.kind]
+                lane.queued -= 1
+                lane.finish(job)
+                job.update(status="cancelled", stage="cancelled", finished_at=time.time())
+                storage.release(job.id)
+        return job
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"submitted": self.submitted, "coalesced": self.coalesced, "inflight": len(self._inflight),
+                    "pipelines": {kind: lane.stats() for kind, lane in self._lanes.items()}}
+
+    def shutdown(self):
+        for lane in self._lanes.values():
+            lane.close()
+
+
+jobs = JobManager()
@@ -0,0 +1,30 @@
+import os
+
+from yt_dlp.extractor.common import InfoExtractor
+from yt_dlp.utils import ExtractorError
+
+# Thư mục phụ đề mẫu cho extractor thay thế; để trống thì không đăng ký extractor này
+LOCAL_SUBS_DIR = os.environ.get("YTDLP_LOCAL_SUBS_DIR", "")
+LOCAL_SCHEME = "local:"
+
+
+class LocalSubtitlesIE(InfoExtractor):
+    """Extractor thay YouTube khi thử nghiệm: local:<id> trả phụ đề từ LOCAL_SUBS_DIR/<id>.<lang>.vtt.
+
+    Phụ đề nằm sẵn trong trường "data" nên không có request mạng nào.
+    """
+
+    IE_NAME = "local"
+    _VALID_URL = r"local:(?P<id>[\w-]+)"
+
+    def _real_extract(self, url):
+        vid = self._match_id(url)
+        prefix = f"{vid}."
+        captions = {}
+        for name in sorted(os.listdir(LOCAL_SUBS_DIR)):
+            if name.startswith(prefix) and name.endswith(".vtt"):
+                with open(os.path.join(LOCAL_SUBS_DIR, name), "r", encoding="utf-8") as f:
+                    captions[name[len(prefix):-len(".vtt")]] = [{"ext": "vtt", "data": f.read()}]
+        if not captions:
+            raise ExtractorError(f"Không có phụ đề mẫu cho {vid}", expected=True)
+        return {"id": vid, "title": vid, "automatic_captions": captions}
@@ -0,0 +1,116 @@
+import os
+from collections import deque
+
+from faster_whisper.vad import VadOptions, get_speech_timestamps
+
+from audio_prep import SAMPLE_RATE, VAD_FILTER, VAD_PARAMETERS, audio_duration, load_audio
+from cpu_pool import CPU_POOL_WORKERS, get_pool
+from model_registry import DEFAULT_COMPUTE_TYPE, DEFAULT_MODEL_SIZE, registry
+
+# File dài hơn ngưỡng này thì cắt theo khoảng lặng và nhận dạng song song
+LONG_MEDIA_SECONDS = int(os.environ.get("LONG_MEDIA_SECONDS", "1200"))
+CHUNK_SECONDS = int(os.environ.get("LONG_MEDIA_CHUNK_SECONDS", "300"))
+# Chunk đầu ngắn để cue đầu tiên có sớm (client xem được trong lúc phần sau còn nhận dạng)
+FIRST_CHUNK_SECONDS = int(os.environ.get("FIRST_CHUNK_SECONDS", "30"))
+CHUNK_WORKERS = CPU_POOL_WORKERS
+# Segment ở đầu chunk sau trùng segment cuối chunk trước trong khoảng này thì bỏ
+BOUNDARY_SECONDS = 1.0
+
+
+def is_long(duration: float) -> bool:
+    return CHUNK_WORKERS > 1 and duration > LONG_MEDIA_SECONDS
+
+
+def plan_chunks(audio, chunk_seconds: float = CHUNK_SECONDS, first_chunk_seconds: float = None) -> list:
+    """Cắt audio thành các đoạn ~chunk_seconds, điểm cắt nằm giữa khoảng lặng do VAD tìm ra."""
+    chunk_samples = int(chunk_seconds * SAMPLE_RATE)
+    first_samples = int((first_chunk_seconds or chunk_seconds) * SAMPLE_RATE)
+    speech = get_speech_timestamps(audio, VadOptions(min_silence_duration_ms=500))
+    cuts = [0]
+    for current, following in zip(speech, speech[1:]):
+        if current["end"] - cuts[-1] >= (first_samples if len(cuts) == 1 else chunk_samples):
+            cuts.append((current["end"] + following["start"]) // 2)
+    cuts.append(len(audio))
+    return [(start, end) for start, end in zip(cuts, cuts[1:]) if end > start]
+
+
+def _plan_file(path: str, chunk_seconds: float, first_chunk_seconds: float) -> list:
+    # Chạy trong tiến trình con: VAD trên cả file cũng là việc nặng CPU
+    return plan_chunks(load_audio(path), chunk_seconds, first_chunk_seconds)
+
+
+def _transcribe_chunk(audio, offset: float, model_size: str, compute_type: str, cpu_threads: int,
+                      language: str = None):
+    # audio là mảng float32 hoặc (đường dẫn wav, mẫu đầu, mẫu cuối) để tiến trình con tự đọc đoạn của mình
+    if isinstance(audio, tuple):
+        audio = load_audio(*audio)
+    with registry.checkout(model_size, compute_type, cpu_threads) as model:
+        segments, info = model.transcribe(audio, language=language, vad_filter=VAD_FILTER,
+                                          vad_parameters=VAD_PARAMETERS)
+        cues = [(seg.start + offset, seg.end + offset, seg.text.strip()) for seg in segments]
+    return cues, info.language
+
+
+def transcribe_parallel(audio, chunk_seconds: float = CHUNK_SECONDS, workers: int = CHUNK_WORKERS,
+                        model_size: str = DEFAULT_MODEL_SIZE, compute_type: str = DEFAULT_COMPUTE_TYPE,
+                        language: str = None, first_chunk_seconds: float = FIRST_CHUNK_SECONDS):
+    """Nhận dạng song song từng chunk trên process pool.
+
+    audio là mảng float32 16 kHz hoặc đường dẫn wav đã qua audio_prep.prepare_audio; với đường dẫn,
+    tiến trình con tự đọc và chia chunk nên tiến trình web không phải giải mã audio.
+    chunk_seconds=None: cả file là một chunk (media ngắn, giữ nguyên ngữ cảnh cho whisper).
+    Ngôn ngữ nhận ra ở chunk đầu được dùng cho mọi chunk sau để clip nhiều thứ tiếng không bị đổi giữa chừng.
+    Trả về (generator các cue (start, end, text) theo đúng thứ tự, info); info["language"] có sau chunk đầu.
+    """
+    pool = get_pool(workers, model_size, compute_type)
+    if chunk_seconds is None:
+        duration = audio_duration(audio) if isinstance(audio, str) else len(audio) / SAMPLE_RATE
+        pieces = [((audio, 0, None) if isinstance(audio, str) else audio, 0)]
+    elif isinstance(audio, str):
+        chunks = pool.submit(_plan_file, audio, chunk_seconds, first_chunk_seconds).result()
+        duration = chunks[-1][1] / SAMPLE_RATE if chunks else 0.0
+        pieces = [((audio, start, end), start) for start, end in chunks]
+    else:
+        duration = len(audio) / SAMPLE_RATE
+        pieces = [(audio[start:end], start) for start, end in plan_chunks(audio, chunk_seconds, first_chunk_seconds)]
+    info = {"duration": duration, "language": language}
+
+    def generate():
+        # Chỉ giữ tối đa 2 chunk/worker trong pool, gửi tiếp khi chunk đầu hàng đợi xong.
+        # Chưa biết ngôn ngữ thì chỉ gửi chunk đầu (ngắn), các chunk sau đợi ngôn ngữ nó nhận ra
+        pending = deque()
+        remaining = iter(pieces)
+        previous = None
+        try:
+            while True:
+                while len(pending) < (pool.workers * 2 if info["language"] else 1):
+                    piece = next(remaining, None)
+                    if piece is None:
+                        break
+                    chunk, start = piece
+                    pending.append(pool.submit(_transcribe_chunk, chunk, start / SAMPLE_RATE,
+                                               model_size, compute_type, pool.cpu_threads, info["language"]))
+                if not pending:
+                    return
+                cues, chunk_language = pending.popleft().result()
+                info["language"] = info["language"] or chunk_language
+                for cue in _stitch(previous, cues):
+                    previous = cue
+                    yield cue
+        finally:
+            for future in pending:
+                future.cancel()
+
+    return generate(), info
+
+
+def _stitch(previous: tuple, cues: list):
+    # Bỏ segment lặp ở ranh giới chunk và không để thời gian chồng lên cue trước
+    for i, (start, end, text) in enumerate(cues):
+        if previous is not None:
+            if i == 0 and start - previous[1] < BOUNDARY_SECONDS and text.split() == previous[2].split():
+                continue
+            start = max(start, previous[1])
+            end = max(end, start)
+        previous = (start, end, text)
+        yield previous
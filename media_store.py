@@ -0,0 +1,74 @@
+import json
+import os
+import re
+import uuid
+
+from audio_prep import AUDIO_CACHE_DIR
+from storage import OUTPUT_DIR, StorageManager
+
+# Kho lưu theo nội dung: video lưu một bản theo sha256, transcript lưu theo (sha256, model)
+MEDIA_DIR = OUTPUT_DIR  # để /download phục vụ được
+TRANSCRIPT_DIR = os.path.join("cache", "transcripts")
+os.makedirs(TRANSCRIPT_DIR, exist_ok=True)
+
+# Cache wav 16 kHz và transcript có TTL + quota riêng, dọn cùng đợt với OUTPUT_DIR (storage.evict_all)
+AUDIO_CACHE_TTL = int(os.environ.get("AUDIO_CACHE_TTL", str(3 * 24 * 3600)))
+AUDIO_CACHE_QUOTA_BYTES = int(os.environ.get("AUDIO_CACHE_QUOTA_BYTES", str(5 * 1024 ** 3)))
+TRANSCRIPT_CACHE_TTL = int(os.environ.get("TRANSCRIPT_CACHE_TTL", str(30 * 24 * 3600)))
+TRANSCRIPT_CACHE_QUOTA_BYTES = int(os.environ.get("TRANSCRIPT_CACHE_QUOTA_BYTES", str(512 * 1024 ** 2)))
+
+audio_cache = StorageManager(AUDIO_CACHE_DIR, AUDIO_CACHE_TTL, AUDIO_CACHE_QUOTA_BYTES,
+                             os.path.join("cache", "audio.sqlite3"))
+transcript_cache = StorageManager(TRANSCRIPT_DIR, TRANSCRIPT_CACHE_TTL, TRANSCRIPT_CACHE_QUOTA_BYTES,
+                                  os.path.join("cache", "transcripts.sqlite3"))
+
+
+def media_filename(sha256: str, original_name: str) -> str:
+    ext = re.sub(r"[^\w]", "", os.path.splitext(original_name or "")[1].lower())
+    return f"media_{sha256}.{ext}" if ext else f"media_{sha256}"
+
+
+def store_media(tmp_path: str, sha256: str, original_name: str) -> str:
+    """Chuyển file vừa upload vào kho; nội dung đã có thì bỏ bản mới."""
+    path = os.path.join(MEDIA_DIR, media_filename(sha256, original_name))
+    if os.path.exists(path):
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, path)
+    return path
+
+
+def _transcript_path(sha256: str, model_size: str) -> str:
+    return os.path.join(TRANSCRIPT_DIR, f"{sha256}_{model_size}.json")
+
+
+def has_transcript(sha256: str, model_size: str) -> bool:
+    return os.path.exists(_transcript_path(sha256, model_size))
+
+
+def load_transcript(sha256: str, model_size: str):
+    path = _transcript_path(sha256, model_size)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    transcript_cache.touch(os.path.basename(path))
+    return data
+
+
+def save_transcript(job_id: str, sha256: str, model_size: str, segments: list, language: str, duration: float):
+    data = {
+        "sha256": sha256,
+        "model": model_size,
+        "language": language,
+        "duration": duration,
+        "segments": [list(seg) for seg in segments],
+    }
+    # Ghi ra file tạm rồi đổi tên để không ai đọc phải file dở dang
+    path = _transcript_path(sha256, model_size)
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp, path)
+    transcript_cache.register(job_id, path, sha256)
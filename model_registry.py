@@ -0,0 +1,110 @@
+import os
+import queue
+import threading
+from contextlib import contextmanager
+
+from faster_whisper import WhisperModel
+
+# Cấu hình model whisper mặc định (có thể đổi bằng biến môi trường)
+DEFAULT_MODEL_SIZE = os.environ.get("WHISPER_MODEL", "tiny")
+DEFAULT_COMPUTE_TYPE = os.environ.get("WHISPER_COMPUTE_TYPE", "int8")
+DEFAULT_CPU_THREADS = int(os.environ.get("WHISPER_CPU_THREADS", "0"))
+POOL_SIZE = int(os.environ.get("WHISPER_POOL_SIZE", "2"))
+
+
+class ModelPool:
+    """Giữ tối đa `max_instances` model đã nạp sẵn cho một cấu hình."""
+
+    def __init__(self, size: str, compute_type: str, cpu_threads: int, max_instances: int):
+        self.key = (size, compute_type, cpu_threads)
+        self.max_instances = max(1, max_instances)
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _load(self) -> WhisperModel:
+        size, compute_type, cpu_threads = self.key
+        return WhisperModel(size, device="cpu", compute_type=compute_type, cpu_threads=cpu_threads)
+
+    def _reserve(self) -> bool:
+        with self._lock:
+            if self._created >= self.max_instances:
+                return False
+            self._created += 1
+            return True
+
+    def _create(self) -> WhisperModel:
+        try:
+            return self._load()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    def warm(self, count: int = 1):
+        for _ in range(min(count, self.max_instances)):
+            if not self._reserve():
+                break
+            self._idle.put(self._create())
+
+    def acquire(self, timeout: float = None) -> WhisperModel:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        # Chưa đủ số instance -> nạp thêm, ngược lại chờ instance được trả về
+        if self._reserve():
+            return self._create()
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"Không có model whisper rảnh cho {self.key}")
+
+    def release(self, model: WhisperModel):
+        self._idle.put(model)
+
+    def stats(self) -> dict:
+        return {"created": self._created, "idle": self._idle.qsize(), "max": self.max_instances}
+
+
+class ModelRegistry:
+    """Các pool model whisper, khóa theo (size, compute_type, cpu_threads)."""
+
+    def __init__(self, max_instances: int = POOL_SIZE):
+        self.max_instances = max_instances
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def pool(self, size: str = DEFAULT_MODEL_SIZE, compute_type: str = DEFAULT_COMPUTE_TYPE,
+             cpu_threads: int = DEFAULT_CPU_THREADS) -> ModelPool:
+        key = (size, compute_type, cpu_threads)
+        with self._lock:
+            if key not in self._pools:
+                self._pools[key] = ModelPool(size, compute_type, cpu_threads, self.max_instances)
+            return self._pools[key]
+
+    def warm(self, size: str = DEFAULT_MODEL_SIZE, compute_type: str = DEFAULT_COMPUTE_TYPE,
+             cpu_threads: int = DEFAULT_CPU_THREADS, count: int = 1):
+        self.pool(size, compute_type, cpu_threads).warm(count)
+
+    @contextmanager
+    def checkout(self, size: str = DEFAULT_MODEL_SIZE, compute_type: str = DEFAULT_COMPUTE_TYPE,
+                 cpu_threads: int = DEFAULT_CPU_THREADS, timeout: float = None):
+        pool = self.pool(size, compute_type, cpu_threads)
+        model = pool.acquire(timeout)
+        try:
+            yield model
+        finally:
+            pool.release(model)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"/".join(map(str, k)): p.stats() for k, p in self._pools.items()}
+
+    def clear(self):
+        with self._lock:
+            self._pools.clear()
+
+
+registry = ModelRegistry()
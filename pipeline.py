@@ -0,0 +1,277 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack, contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from audio_prep import audio_duration, prepare_audio, probe_duration
+from jobs import Job
+from long_media import CHUNK_SECONDS, is_long, transcribe_parallel
+from media_store import audio_cache, has_transcript, load_transcript, save_transcript
+from model_registry import DEFAULT_MODEL_SIZE
+from storage import OUTPUT_DIR, storage
+from subtitles import collapse_rolling, drop_transitions, parse_vtt, srt_block, write_srt
+from translation import translate_batch
+from translation_cache import normalize
+from youtube import SUB_LANG, cached_subtitles, fetch_subtitles, store_subtitles, video_id
+
+# Pipeline nhận dạng -> dịch: hàng đợi segment giới hạn, mỗi lô dịch tối đa
+# PIPELINE_BATCH cue hoặc chờ PIPELINE_FLUSH_SECONDS giây
+SEGMENT_QUEUE_SIZE = 64
+PIPELINE_BATCH = int(os.environ.get("PIPELINE_BATCH", "16"))
+PIPELINE_FLUSH_SECONDS = float(os.environ.get("PIPELINE_FLUSH_SECONDS", "2"))
+TRANSLATE_WORKERS = int(os.environ.get("TRANSLATE_WORKERS", "4"))
+# Ước lượng chi phí khi ffprobe không đọc được: ~128 kbit/s, tức 16 KB mỗi giây media
+FALLBACK_BYTES_PER_SECOND = 16000
+# Đã có transcript thì chỉ còn phần dịch, coi như một job rất ngắn
+TRANSLATE_ONLY_COST = 1.0
+
+_translate_pool = ThreadPoolExecutor(max_workers=TRANSLATE_WORKERS, thread_name_prefix="translate")
+_DONE = object()
+
+
+def download_url(path: str) -> str:
+    return f"/download/{os.path.basename(path)}"
+
+
+# =======================
+# 1. Xử lý YouTube URL
+# =======================
+def run_process(job: Job, youtube_url: str, target_langs: list) -> dict:
+    req_id = job.id
+    out_original = os.path.join(OUTPUT_DIR, f"subs_{req_id}_original.srt")
+    out_translated = translated_paths(req_id, target_langs)
+
+    # Video này vừa tải phụ đề gần đây -> bỏ qua yt-dlp
+    vid = video_id(youtube_url)
+    vtt_path = cached_subtitles(vid, SUB_LANG) if vid else None
+    if vtt_path:
+        with open(vtt_path, "r", encoding="utf-8") as f:
+            vtt = f.read()
+    else:
+        vtt = _fetch_subtitles(job, youtube_url)
+        if vid:
+            store_subtitles(vid, SUB_LANG, vtt)
+
+    # Đọc VTT thẳng thành cue, gộp dòng lặp cuộn rồi dịch từng dòng -> bản dịch
+    job.check_cancelled()
+    job.update(stage="translating")
+    # Giữ cả cue chuyển tiếp để số dòng "trước" tính đúng trên VTT gốc
+    parsed = list(parse_vtt(vtt.splitlines(), keep_transitions=True))
+    raw_cues = list(drop_transitions(parsed))
+    cues = collapse_rolling(raw_cues)
+
+    lines = [text.split("\n") for _, _, text in cues]
+    flat = [line for cue_lines in lines for line in cue_lines]
+
+    with _discard_on_error([out_original, *out_translated.values()]):
+        with open(out_original, "w", encoding="utf-8") as f:
+            write_srt(f, cues)
+
+        # Dùng chung một bản phụ đề gốc, dịch song song sang từng ngôn ngữ
+        futures = {lang: _translate_pool.submit(translate_batch, flat, lang) for lang in target_langs}
+        translated_texts = {}
+        for lang, future in futures.items():
+            translated = iter(future.result())
+            translated_texts[lang] = ["\n".join(next(translated) for _ in cue_lines) for cue_lines in lines]
+            with open(out_translated[lang], "w", encoding="utf-8") as f:
+                write_srt(f, [(start, end, t) for (start, end, _), t in zip(cues, translated_texts[lang])])
+        for i, (start, end, text) in enumerate(cues):
+            job.add_cue(start, end, text, {lang: texts[i] for lang, texts in translated_texts.items()})
+        for path in [out_original, *out_translated.values()]:
+            storage.register(job.id, path)
+
+    # Số dòng phải dịch trước/sau khi gộp (translate_batch chỉ dịch mỗi dòng khác nhau một lần)
+    lines_before = sum(len(text.split("\n")) for _, _, text in parsed)
+    unique_lines = len({normalize(line) for line in flat if line.strip()})
+    return {
+        "srt_original_url": download_url(out_original),
+        **translated_urls(out_translated),
+        "translation_stats": {
+            "vtt_cues": len(parsed),
+            "cues": len(cues),
+            "lines_before": lines_before,
+            "lines_translated": unique_lines,
+            "reduction_percent": round((1 - unique_lines / lines_before) * 100, 1) if lines_before else 0.0,
+        },
+    }
+
+
+def _fetch_subtitles(job: Job, youtube_url: str) -> str:
+    # yt-dlp chạy ngay trong tiến trình (instance đã nạp sẵn), phụ đề về thẳng bộ nhớ, không ghi OUTPUT_DIR
+    job.update(stage="downloading", tool={"tool": "yt-dlp", "step": "extract_info"})
+    vtt = fetch_subtitles(youtube_url, SUB_LANG)
+    job.update(tool={"tool": "yt-dlp", "step": "done", "bytes": len(vtt)})
+    return vtt
+
+
+# =======================
+# 2. Xử lý file upload (faster-whisper)
+# =======================
+def run_upload(job: Job, input_path: str, sha256: str, target_langs: list) -> dict:
+    req_id = job.id
+    out_original = os.path.join(OUTPUT_DIR, f"subs_{req_id}_original.srt")
+    out_translated = translated_paths(req_id, target_langs)
+
+    # Ghi phụ đề gốc và các bản dịch ngay khi từng cue được dịch xong
+    job.update(stage="transcribing")
+    with _discard_on_error([out_original, *out_translated.values()]):
+        with ExitStack() as stack:
+            f_o = stack.enter_context(open(out_original, "w", encoding="utf-8"))
+            f_t = {lang: stack.enter_context(open(path, "w", encoding="utf-8")) for lang, path in out_translated.items()}
+            for i, (start, end, text, translations) in enumerate(pipelined_cues(job, input_path, sha256, target_langs), start=1):
+                f_o.write(srt_block(i, start, end, text))
+                for lang, trans_text in translations.items():
+                    f_t[lang].write(srt_block(i, start, end, trans_text))
+                job.add_cue(start, end, text, translations)
+                job.check_cancelled()
+        for path in [out_original, *out_translated.values()]:
+            storage.register(job.id, path)
+
+    return {
+        "video_url": download_url(input_path),
+        "srt_original_url": download_url(out_original),
+        **translated_urls(out_translated),
+    }
+
+
+def upload_cost(input_path: str, sha256: str) -> float:
+    """Chi phí ước lượng (giây media phải nhận dạng) để scheduler xếp job ngắn lên trước."""
+    if has_transcript(sha256, DEFAULT_MODEL_SIZE):
+        return TRANSLATE_ONLY_COST
+    duration = probe_duration(input_path)
+    if duration is None:
+        duration = os.path.getsize(input_path) / FALLBACK_BYTES_PER_SECOND
+    return duration
+
+
+@contextmanager
+def _discard_on_error(paths: list):
+    # Job lỗi / bị hủy giữa chừng: xóa phụ đề dở dang thay vì để lại file ngoài chỉ mục
+    try:
+        yield
+    except BaseException:
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        raise
+
+
+def translated_paths(req_id: str, target_langs: list) -> dict:
+    return {lang: os.path.join(OUTPUT_DIR, f"subs_{req_id}_{lang}.srt") for lang in target_langs}
+
+
+def translated_urls(paths: dict) -> dict:
+    # srt_translated_url giữ cho client cũ: bản dịch của ngôn ngữ đầu tiên
+    urls = {lang: download_url(path) for lang, path in paths.items()}
+    return {"srt_translated_url": next(iter(urls.values())), "srt_translated_urls": urls}
+
+
+def pipelined_cues(job: Job, input_path: str, sha256: str, target_langs: list):
+    """Nhận dạng và dịch song song: trả về (start, end, text, {ngôn ngữ: bản dịch}) theo đúng thứ tự."""
+    segments = queue.Queue(maxsize=SEGMENT_QUEUE_SIZE)
+    stop = threading.Event()
+    threading.Thread(target=_produce_segments, args=(job, input_path, sha256, segments, stop),
+                     name=f"transcribe-{job.id}", daemon=True).start()
+
+    pending = deque()
+    batch, deadline, finished = [], 0.0, False
+    try:
+        while not finished:
+            if batch:
+                timeout = max(0.0, deadline - time.monotonic())
+            else:
+                timeout = 0.2 if pending else None
+            try:
+                item = segments.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _DONE:
+                finished = True
+            elif isinstance(item, Exception):
+                raise item
+            elif item is not None:
+                if not batch:
+                    deadline = time.monotonic() + PIPELINE_FLUSH_SECONDS
+                batch.append(item)
+
+            # Gom lô theo số cue hoặc thời gian chờ rồi đẩy sang pool dịch
+            if batch and (finished or item is None or len(batch) >= PIPELINE_BATCH):
+                pending.append((batch, {lang: _submit_translation(batch, lang) for lang in target_langs}))
+                batch = []
+
+            # Lô ở đầu hàng dịch xong (mọi ngôn ngữ) thì nhả ra, giữ đúng thứ tự cue
+            while pending and (finished or all(f.done() for f in pending[0][1].values())):
+                cues, futures = pending.popleft()
+                results = {lang: future.result() for lang, future in futures.items()}
+                for i, cue in enumerate(cues):
+                    yield (*cue, {lang: texts[i] for lang, texts in results.items()})
+    finally:
+        stop.set()
+
+
+def _produce_segments(job: Job, input_path: str, sha256: str, segments: queue.Queue, stop: threading.Event):
+    result = _DONE
+    try:
+        # Nội dung này đã nhận dạng rồi -> dùng lại transcript, chỉ cần dịch
+        transcript = load_transcript(sha256, DEFAULT_MODEL_SIZE)
+        if transcript is not None:
+            job.update(duration=transcript["duration"], stage="translating")
+            for cue in transcript["segments"]:
+                if not _put(segments, tuple(cue), stop):
+                    return
+                job.update(position=cue[1])
+        else:
+            _transcribe_into(job, input_path, sha256, segments, stop)
+        job.update(stage="translating")
+    except Exception as e:
+        result = e
+    _put(segments, result, stop)
+
+
+def _transcribe_into(job: Job, input_path: str, sha256: str, segments: queue.Queue, stop: threading.Event):
+    # Tách audio 16 kHz mono một lần (cache theo sha256) thay vì để whisper giải mã cả video
+    job.update(stage="extracting_audio")
+    wav_path = prepare_audio(input_path, sha256, on_progress=lambda position: job.update(
+        tool={"tool": "ffmpeg", "position": round(position, 2)}), cancel=job.cancelled)
+    # Gắn wav vào job: không bị dọn khi job còn chạy, lần dùng lại tính là truy cập mới (LRU)
+    audio_cache.register(job.id, wav_path, sha256)
+    duration = round(audio_duration(wav_path), 2)
+    job.update(duration=duration, stage="transcribing")
+
+    # Cả VAD lẫn whisper chạy trên process pool riêng (cpu_pool); luồng job chỉ nhận cue theo thứ tự.
+    # Chỉ media dài mới cắt chunk song song, media ngắn gửi nguyên file thành một chunk
+    cues = []
+    generator, info = transcribe_parallel(wav_path, CHUNK_SECONDS if is_long(duration) else None)
+    for cue in generator:
+        if not _put(segments, cue, stop):
+            generator.close()
+            return
+        cues.append(cue)
+        job.update(position=cue[1])
+    save_transcript(job.id, sha256, DEFAULT_MODEL_SIZE, cues, info["language"], duration)
+
+
+def _put(segments: queue.Queue, item, stop: threading.Event) -> bool:
+    # Hàng đợi đầy thì chờ, nhưng bỏ cuộc nếu phía tiêu thụ đã dừng
+    while not stop.is_set():
+        try:
+            segments.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _submit_translation(cues: list, target_lang: str) -> Future:
+    texts = [text for _, _, text in cues]
+    if target_lang == "en":
+        future = Future()
+        future.set_result(texts)
+        return future
+    return _translate_pool.submit(translate_batch, texts, target_lang)
@@ -0,0 +1,89 @@
+import gzip
+import os
+import uuid
+
+try:
+    import brotli
+except ImportError:
+    # brotli là tùy chọn: thiếu thì chỉ tạo bản gzip
+    brotli = None
+
+# Chỉ nén sẵn artifact dạng text (phụ đề); video/audio đã nén sẵn trong container
+COMPRESSIBLE_EXTENSIONS = (".srt", ".vtt")
+# Tên mã hóa trong Accept-Encoding -> hậu tố file, theo thứ tự ưu tiên khi client chấp nhận ngang nhau
+SUFFIXES = {"br": ".br", "gzip": ".gz"}
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+
+
+def is_compressible(name: str) -> bool:
+    return name.endswith(COMPRESSIBLE_EXTENSIONS)
+
+
+def variant_path(path: str, encoding: str) -> str:
+    return path + SUFFIXES[encoding]
+
+
+def split_variant(name: str):
+    """'a.srt.gz' -> ('a.srt', 'gzip'); tên không phải bản nén -> (name, None)."""
+    for encoding, suffix in SUFFIXES.items():
+        base = name[:-len(suffix)]
+        if name.endswith(suffix) and is_compressible(base):
+            return base, encoding
+    return name, None
+
+
+def _compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, mode=brotli.MODE_TEXT, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def precompress(path: str) -> dict:
+    """Ghi các bản nén cạnh file gốc một lần khi job xong, trả về {encoding: kích thước}.
+
+    Bản nén không nhỏ hơn file gốc thì bỏ, /download sẽ gửi file gốc.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+
+    sizes = {}
+    for encoding in SUFFIXES:
+        if encoding == "br" and brotli is None:
+            continue
+        compressed = _compress(data, encoding)
+        if len(compressed) >= len(data):
+            continue
+        dest = variant_path(path, encoding)
+        tmp = f"{dest}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(compressed)
+        os.replace(tmp, dest)
+        sizes[encoding] = len(compressed)
+    return sizes
+
+
+def negotiate(accept_encoding: str, available) -> str:
+    """Chọn bản nén tốt nhất theo Accept-Encoding (có q-value); None nghĩa là gửi file gốc."""
+    if not accept_encoding or not available:
+        return None
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+
+    best, best_q = None, 0.0
+    for encoding in SUFFIXES:
+        if encoding not in available:
+            continue
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
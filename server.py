@@ -1,16 +1,69 @@
-from fastapi import FastAPI, Form, UploadFile, File
-from fastapi.responses import FileResponse, JSONResponse
-from deep_translator import GoogleTranslator
-from faster_whisper import WhisperModel
+import asyncio
+from contextlib import asynccontextmanager
+import json
+from typing import List, Union
+from fastapi import FastAPI, Form, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+from downloads import file_response
+from jobs import JobQueueFull, jobs
+import cpu_pool
+import tools
+from model_registry import DEFAULT_MODEL_SIZE
+from media_store import audio_cache, store_media, transcript_cache
+from pipeline import download_url, run_process, run_upload, upload_cost
+from storage import OUTPUT_DIR, STORAGE_SWEEP_SECONDS, evict_all, storage
+from translation import translate_many, translate_text
+from translation_cache import cache
+from uploads import MAX_UPLOAD_BYTES, MultipartUpload, UploadInvalid, UploadTooLarge
+from youtube import video_id, warm as warm_youtube
 import uuid
 import os
-import subprocess
 import re
 
-app = FastAPI()
 
-OUTPUT_DIR = "outputs"
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Khởi động sẵn process pool nhận dạng (mỗi tiến trình con nạp model whisper một lần)
+    # và chờ chúng sẵn sàng: nạp model lỗi thì server dừng ngay lúc khởi động thay vì mọi /upload đều lỗi
+    await asyncio.to_thread(cpu_pool.get_pool().warm, True)
+    # Import yt-dlp + nạp extractor trước để /process đầu tiên chỉ còn thời gian tải phụ đề
+    warm_youtube()
+    sweeper = asyncio.create_task(sweep_storage())
+    yield
+    sweeper.cancel()
+    jobs.shutdown()
+    cpu_pool.shutdown()
+
+
+async def sweep_storage():
+    # Định kỳ dọn OUTPUT_DIR và cache audio/transcript theo TTL và quota của từng thư mục
+    while True:
+        await asyncio.sleep(STORAGE_SWEEP_SECONDS)
+        await asyncio.to_thread(evict_all)
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.exception_handler(JobQueueFull)
+async def queue_full(request: Request, exc: JobQueueFull):
+    # Quá tải thì từ chối ngay để các job đang chạy giữ được tốc độ
+    return JSONResponse({"error": str(exc), "retry_after": exc.retry_after}, status_code=429,
+                        headers={"retry-after": str(exc.retry_after)})
+
+LANG_RE = re.compile(r"^[A-Za-z]{2,3}(-[A-Za-z0-9]{2,8})?$")
+# Giới hạn số đoạn trong một request /translate/batch
+TRANSLATE_BATCH_MAX_ITEMS = int(os.environ.get("TRANSLATE_BATCH_MAX_ITEMS", "1000"))
+# Stream cue: chu kỳ kiểm tra cue mới và gửi dòng giữ kết nối
+CUE_POLL_SECONDS = 0.5
+CUE_KEEPALIVE_SECONDS = 15
+
+
+class BatchTranslateRequest(BaseModel):
+    texts: List[str]
+    target: Union[str, List[str]] = "vi"
+    source: str = "auto"
 
 
 @app.get("/")
@@ -20,146 +73,211 @@ def home():
 
 @app.get("/translate")
 def translate(text: str, target: str = "vi"):
-    translated = GoogleTranslator(source="auto", target=target).translate(text)
+    translated = translate_text(text, target)
     return {"original": text, "translated": translated, "target_lang": target}
 
 
-# =======================
-# 1. Xử lý YouTube URL
-# =======================
-@app.post("/process")
-def process(youtube_url: str = Form(...), target_lang: str = Form("vi")):
-    req_id = str(uuid.uuid4())[:8]
-    out_original = os.path.join(OUTPUT_DIR, f"subs_{req_id}_original.srt")
-    out_translated = os.path.join(OUTPUT_DIR, f"subs_{req_id}_translated.srt")
+@app.post("/translate/batch")
+def translate_batch_endpoint(body: BatchTranslateRequest):
+    targets, error = check_batch(body)
+    if error:
+        return error
+    results = [{"original": text, "translated": {}} for text in body.texts]
+    for i, target, translated in translate_many(body.texts, targets, body.source):
+        results[i]["translated"][target] = translated
+    return {"source": body.source, "targets": targets, "results": results}
 
-    try:
-        cmd = [
-            "yt-dlp",
-            "--write-auto-subs",
-            "--sub-lang", "en",
-            "--skip-download",
-            "-o", f"{OUTPUT_DIR}/{req_id}.%(ext)s",
-            youtube_url
-        ]
-        result = subprocess.run(cmd, capture_output=True, text=True)
-
-        if result.returncode != 0:
-            return JSONResponse(
-                {"error": "Không lấy được phụ đề từ YouTube", "detail": result.stderr},
-                status_code=400
-            )
-
-        downloaded_vtt = None
-        for f in os.listdir(OUTPUT_DIR):
-            if f.startswith(req_id) and f.endswith(".vtt"):
-                downloaded_vtt = os.path.join(OUTPUT_DIR, f)
-                break
-
-        if not downloaded_vtt:
-            return JSONResponse({"error": "Video không có phụ đề auto"}, status_code=400)
-
-        # convert VTT -> SRT (bản gốc)
-        subprocess.run(["ffmpeg", "-i", downloaded_vtt, out_original], check=True)
-
-        # dịch nội dung -> bản dịch
-        with open(out_original, "r", encoding="utf-8") as f:
-            lines = f.readlines()
-
-        with open(out_translated, "w", encoding="utf-8") as f:
-            for line in lines:
-                if "-->" in line or line.strip().isdigit() or line.strip() == "":
-                    f.write(line)
-                else:
-                    try:
-                        trans = GoogleTranslator(source="auto", target=target_lang).translate(line.strip())
-                    except Exception:
-                        trans = line.strip()
-                    f.write(trans + "\n")
-
-        return {
-            "srt_original_url": f"/download/{os.path.basename(out_original)}",
-            "srt_translated_url": f"/download/{os.path.basename(out_translated)}"
-        }
-
-    except Exception as e:
-        return JSONResponse({"error": str(e)}, status_code=500)
 
+@app.post("/translate/batch/stream")
+def translate_batch_stream(body: BatchTranslateRequest):
+    # Mỗi dòng NDJSON là một đoạn đã dịch xong, không theo thứ tự; client ghép lại theo "index"
+    targets, error = check_batch(body)
+    if error:
+        return error
 
-# =======================
-# 2. Xử lý file upload (faster-whisper)
-# =======================
-@app.post("/upload")
-def upload(file: UploadFile = File(...), target_lang: str = Form("vi")):
-    req_id = str(uuid.uuid4())[:8]
-    safe_name = safe_filename(file.filename)
-    video_filename = f"{req_id}_{safe_name}"
-    input_path = os.path.join(OUTPUT_DIR, video_filename)
+    def lines():
+        for i, target, translated in translate_many(body.texts, targets, body.source):
+            item = {"index": i, "target": target, "original": body.texts[i], "translated": translated}
+            yield json.dumps(item, ensure_ascii=False) + "\n"
 
-    out_original = os.path.join(OUTPUT_DIR, f"subs_{req_id}_original.srt")
-    out_translated = os.path.join(OUTPUT_DIR, f"subs_{req_id}_translated.srt")
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
 
-    # Lưu file upload
-    with open(input_path, "wb") as f:
-        f.write(file.file.read())
 
-    try:
-        model = WhisperModel("tiny", device="cpu", compute_type="int8")
-        segments, _ = model.transcribe(input_path)
+def check_batch(body: BatchTranslateRequest):
+    if len(body.texts) > TRANSLATE_BATCH_MAX_ITEMS:
+        return None, JSONResponse({"error": f"Tối đa {TRANSLATE_BATCH_MAX_ITEMS} đoạn mỗi request"}, status_code=413)
+    targets = parse_target_langs([body.target] if isinstance(body.target, str) else body.target)
+    if not targets or not (body.source == "auto" or LANG_RE.match(body.source)):
+        return None, JSONResponse({"error": "target/source không hợp lệ"}, status_code=400)
+    return targets, None
 
-        # Ghi phụ đề gốc
-        with open(out_original, "w", encoding="utf-8") as f_o, \
-             open(out_translated, "w", encoding="utf-8") as f_t:
-            for i, seg in enumerate(segments, start=1):
-                start, end, text = seg.start, seg.end, seg.text.strip()
 
-                f_o.write(f"{i}\n")
-                f_o.write(f"{format_time(start)} --> {format_time(end)}\n")
-                f_o.write(text + "\n\n")
+@app.get("/metrics")
+def metrics():
+    return {
+        "translation_cache": cache.stats(),
+        "cpu_pool": cpu_pool.stats(),
+        "tools": tools.stats(),
+        "jobs": jobs.stats(),
+        "storage": storage.stats(),
+        "audio_cache": audio_cache.stats(),
+        "transcript_cache": transcript_cache.stats(),
+    }
 
-                trans_text = text
-                if target_lang != "en":
-                    try:
-                        trans_text = GoogleTranslator(source="auto", target=target_lang).translate(text)
-                    except Exception:
-                        pass
 
-                f_t.write(f"{i}\n")
-                f_t.write(f"{format_time(start)} --> {format_time(end)}\n")
-                f_t.write(trans_text + "\n\n")
+# =======================
+# 1. Xử lý YouTube URL
+# =======================
+@app.post("/process", status_code=202)
+def process(request: Request, youtube_url: str = Form(...), target_lang: List[str] = Form(["vi"])):
+    target_langs = parse_target_langs(target_lang)
+    if not target_langs:
+        return JSONResponse({"error": "target_lang không hợp lệ"}, status_code=400)
 
-        return {
-            "video_url": f"/download/{os.path.basename(video_filename)}",
-            "srt_original_url": f"/download/{os.path.basename(out_original)}",
-            "srt_translated_url": f"/download/{os.path.basename(out_translated)}"
-        }
+    # Cùng video + cùng ngôn ngữ đang xử lý thì dùng chung job
+    key = ("process", video_id(youtube_url) or youtube_url.strip(), tuple(target_langs))
+    job, coalesced = jobs.submit("process", run_process, youtube_url, target_langs, key=key,
+                                 client=client_id(request))
+    return job_response(job, coalesced)
 
-    except Exception as e:
-        return JSONResponse({"error": str(e)}, status_code=500)
 
+# =======================
+# 2. Xử lý file upload (faster-whisper)
+# =======================
+@app.post("/upload", status_code=202)
+async def upload(request: Request):
+    # Từ chối sớm nếu client đã báo kích thước quá lớn
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > MAX_UPLOAD_BYTES:
+        return JSONResponse({"error": "File quá lớn", "max_bytes": MAX_UPLOAD_BYTES}, status_code=413)
+
+    # Hàng chờ upload đầy thì trả 429 trước khi ghi file xuống đĩa
+    jobs.check_capacity("upload")
 
-def format_time(seconds: float) -> str:
-    h = int(seconds // 3600)
-    m = int((seconds % 3600) // 60)
-    s = int(seconds % 60)
-    ms = int((seconds - int(seconds)) * 1000)
-    return f"{h:02}:{m:02}:{s:02},{ms:03}"
+    req_id = str(uuid.uuid4())[:8]
+    tmp_path = os.path.join(OUTPUT_DIR, f".upload_{req_id}")
 
+    # Đọc body multipart ngay khi nhận: file ghi thẳng xuống đĩa, băm và giới hạn kích thước trong lúc nhận,
+    # không để Starlette spool cả body rồi mới chép lại
+    form = MultipartUpload(tmp_path)
+    try:
+        await form.receive(request)
+        target_langs = parse_target_langs(form.fields.get("target_lang") or ["vi"])
+        if not target_langs:
+            return JSONResponse({"error": "target_lang không hợp lệ"}, status_code=400)
+        # Cùng nội dung thì dùng chung một file video
+        input_path = await asyncio.to_thread(store_media, tmp_path, form.sha256, form.filename)
+    except UploadTooLarge as e:
+        return JSONResponse({"error": str(e), "max_bytes": MAX_UPLOAD_BYTES}, status_code=413)
+    except UploadInvalid as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    finally:
+        # Client ngắt giữa chừng / lỗi ghi: không để lại .upload_* ngoài chỉ mục
+        if os.path.exists(tmp_path):
+            await asyncio.to_thread(os.remove, tmp_path)
+    sha256, size = form.sha256, form.size
+    # Ghi vào chỉ mục ngay để file được dọn theo TTL kể cả khi các bước sau lỗi hoặc hàng chờ đầy
+    await asyncio.to_thread(storage.register, req_id, input_path)
+
+    key = ("upload", sha256, tuple(target_langs), DEFAULT_MODEL_SIZE)
+    # Đo thời lượng bằng ffprobe để scheduler cho file ngắn chạy trước
+    cost = await asyncio.to_thread(upload_cost, input_path, sha256)
+    job, coalesced = jobs.submit("upload", run_upload, input_path, sha256, target_langs, job_id=req_id, key=key,
+                                 cost=cost, client=client_id(request))
+    if coalesced:
+        await asyncio.to_thread(storage.register, job.id, input_path)
+    return {**job_response(job, coalesced), "video_url": download_url(input_path), "sha256": sha256, "size": size}
 
-def safe_filename(name: str) -> str:
-    name = re.sub(r"[^\w\d-]", "_", name)
-    return name
+
+# =======================
+# 3. Trạng thái job
+# =======================
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        return JSONResponse(content={"error": "Job not found"}, status_code=404)
+    return {**job.to_dict(), "artifacts": [f"/download/{name}" for name in storage.job_artifacts(job.id)]}
+
+
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    # Kill yt-dlp/ffmpeg đang chạy của job và dừng pipeline ở bước kế tiếp
+    job = jobs.cancel(job_id)
+    if job is None:
+        return JSONResponse(content={"error": "Job not found"}, status_code=404)
+    return job_response(job)
+
+
+@app.get("/jobs/{job_id}/cues/stream")
+async def job_cue_stream(job_id: str, request: Request, from_index: int = 0):
+    """Server-Sent Events: mỗi cue (gốc + bản dịch) được gửi ngay khi pipeline làm xong.
+
+    id của event là số thứ tự cue; nối lại bằng ?from_index=<id cuối> hoặc header Last-Event-ID.
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        return JSONResponse(content={"error": "Job not found"}, status_code=404)
+    last_event_id = request.headers.get("last-event-id", "")
+    index = max(0, int(last_event_id) if last_event_id.isdigit() else from_index)
+
+    async def events():
+        nonlocal index
+        idle = 0.0
+        while not await request.is_disconnected():
+            cues, finished = job.cues_since(index)
+            for cue in cues:
+                yield f"id: {cue['index']}\nevent: cue\ndata: {json.dumps(cue, ensure_ascii=False)}\n\n"
+            index += len(cues)
+            if finished:
+                end = {"status": job.status, "cues": index, "error": job.error}
+                yield f"event: end\ndata: {json.dumps(end, ensure_ascii=False)}\n\n"
+                return
+            idle = 0.0 if cues else idle + CUE_POLL_SECONDS
+            if idle >= CUE_KEEPALIVE_SECONDS:
+                idle = 0.0
+                yield ": keepalive\n\n"
+            await asyncio.sleep(CUE_POLL_SECONDS)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"cache-control": "no-cache", "x-accel-buffering": "no"})
+
+
+def client_id(request: Request) -> str:
+    # Client tự báo id (app nhiều người dùng sau cùng một IP), không có thì dùng IP
+    return request.headers.get("x-client-id") or (request.client.host if request.client else "unknown")
+
+
+def job_response(job, coalesced: bool = False) -> dict:
+    return {"job_id": job.id, "status": job.status, "status_url": f"/jobs/{job.id}",
+            "cues_url": f"/jobs/{job.id}/cues/stream", "coalesced": coalesced}
+
+
+def parse_target_langs(values: List[str]) -> list:
+    # Nhận cả field lặp lại (target_lang=vi&target_lang=ja) lẫn chuỗi "vi,ja,en"
+    langs = [lang.strip() for value in values for lang in value.split(",") if lang.strip()]
+    if not all(LANG_RE.match(lang) for lang in langs):
+        return []
+    return list(dict.fromkeys(langs))
 
 
 @app.get("/download/{filename}")
-def download_file(filename: str):
-    file_path = os.path.join(OUTPUT_DIR, filename)
-    if os.path.exists(file_path):
+def download_file(filename: str, request: Request):
+    # Tra chỉ mục artifact thay vì hỏi hệ thống file
+    file_path = storage.lookup(filename)
+    if file_path is not None:
+        storage.touch(filename)
         if filename.endswith(".srt"):
             media_type = "application/x-subrip"
         elif filename.endswith(".mp4"):
             media_type = "video/mp4"
         else:
             media_type = "application/octet-stream"
-        return FileResponse(file_path, media_type=media_type, filename=filename)
+        # ETag theo hash nội dung, hỗ trợ Range (tua video / tải tiếp), 304 và bản nén sẵn
+        try:
+            return file_response(request, file_path, filename, media_type, storage.sha256(filename),
+                                 storage.encodings(filename))
+        except FileNotFoundError:
+            # Chỉ mục còn nhưng file đã mất: bỏ mục cũ, trả 404 như file không tồn tại
+            storage.forget(filename)
     return JSONResponse(content={"error": "File not found"}, status_code=404)
\ No newline at end of file
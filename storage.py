@@ -0,0 +1,302 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from precompress import is_compressible, precompress, split_variant, variant_path
+
+OUTPUT_DIR = "outputs"
+os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+# Artifact không ai tải trong STORAGE_TTL giây thì xóa; tổng dung lượng vượt quota thì xóa theo LRU
+STORAGE_TTL = int(os.environ.get("STORAGE_TTL", str(24 * 3600)))
+STORAGE_QUOTA_BYTES = int(os.environ.get("STORAGE_QUOTA_BYTES", str(5 * 1024 ** 3)))
+STORAGE_SWEEP_SECONDS = int(os.environ.get("STORAGE_SWEEP_SECONDS", "300"))
+STORAGE_INDEX_DB = os.environ.get("STORAGE_INDEX_DB", os.path.join("cache", "artifacts.sqlite3"))
+
+# File media đã mang sẵn sha256 trong tên (xem media_store.media_filename)
+_MEDIA_RE = re.compile(r"^media_([0-9a-f]{64})(\.|$)")
+
+# Mọi StorageManager đã tạo (outputs + các thư mục cache) để bảo vệ / dọn cùng lúc
+_managers = []
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class StorageManager:
+    """Chỉ mục file trong một thư mục (OUTPUT_DIR, cache) theo job: kích thước, lần truy cập cuối, job nào đang dùng.
+
+    Chỉ mục nằm trong RAM (tra cứu O(1)) và được lưu xuống SQLite để khởi động lại không phải quét thư mục.
+    """
+
+    def __init__(self, root: str = OUTPUT_DIR, ttl: int = STORAGE_TTL, quota_bytes: int = STORAGE_QUOTA_BYTES,
+                 index_path: str = STORAGE_INDEX_DB):
+        self.root = root
+        self.ttl = ttl
+        self.quota_bytes = quota_bytes
+        self._artifacts = {}
+        self._jobs = {}
+        self._protected = set()
+        self._touched = set()
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.evicted_files = 0
+        self.evicted_bytes = 0
+
+        if os.path.dirname(index_path):
+            os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        self._db = sqlite3.connect(index_path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS artifacts"
+                         " (name TEXT PRIMARY KEY, size INTEGER, last_access REAL, sha256 TEXT, encodings TEXT)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS artifact_jobs (name TEXT, job_id TEXT, PRIMARY KEY (name, job_id))")
+        # Chỉ mục tạo trước khi có cột sha256 / encodings
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(artifacts)")]
+        for column in ("sha256", "encodings"):
+            if column not in columns:
+                self._db.execute(f"ALTER TABLE artifacts ADD COLUMN {column} TEXT")
+        self._db.commit()
+        if not self._load():
+            self._scan()
+        _managers.append(self)
+
+    def _load(self) -> bool:
+        rows = self._db.execute("SELECT name, size, last_access, sha256, encodings FROM artifacts").fetchall()
+        for name, size, last_access, sha256, encodings in rows:
+            self._artifacts[name] = {"size": size, "last_access": last_access, "sha256": sha256,
+                                     "encodings": encodings.split(",") if encodings else [], "jobs": set()}
+            self.total_bytes += size
+        for name, job_id in self._db.execute("SELECT name, job_id FROM artifact_jobs"):
+            if name in self._artifacts:
+                self._artifacts[name]["jobs"].add(job_id)
+                self._jobs.setdefault(job_id, set()).add(name)
+        return bool(rows)
+
+    def _scan(self):
+        # Chưa có chỉ mục: nhận các file có sẵn, chưa biết job, lấy mtime làm lần truy cập cuối
+        variants = []
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if not entry.is_file() or entry.name.startswith("."):
+                    continue
+                stat = entry.stat()
+                if split_variant(entry.name)[1]:
+                    variants.append((entry.name, stat.st_size))
+                    continue
+                self._artifacts[entry.name] = {"size": stat.st_size, "last_access": stat.st_mtime,
+                                               "sha256": None, "encodings": [], "jobs": set()}
+                self.total_bytes += stat.st_size
+        # Bản nén tính chung vào artifact gốc; bản nén mồ côi thì xóa
+        for name, size in variants:
+            base, encoding = split_variant(name)
+            if base in self._artifacts:
+                self._artifacts[base]["encodings"].append(encoding)
+                self._artifacts[base]["size"] += size
+                self.total_bytes += size
+            else:
+                os.remove(os.path.join(self.root, name))
+        self._db.executemany("INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?, NULL, ?)",
+                             [(n, a["size"], a["last_access"], ",".join(a["encodings"]))
+                              for n, a in self._artifacts.items()])
+        self._db.commit()
+
+    def register(self, job_id: str, path: str, sha256: str = None):
+        # sha256 truyền vào khi đã biết (file cache đặt tên theo hash) để khỏi đọc lại cả file
+        name = os.path.basename(path)
+        size = os.path.getsize(path)
+        media = _MEDIA_RE.match(name)
+        sha256 = sha256 or (media.group(1) if media else file_sha256(path))
+        # Phụ đề được nén sẵn một lần ở đây, /download không phải nén theo từng request
+        encodings = precompress(path) if is_compressible(name) else {}
+        size += sum(encodings.values())
+        now = time.time()
+        with self._lock:
+            artifact = self._artifacts.get(name)
+            if artifact is None:
+                artifact = self._artifacts[name] = {"size": 0, "last_access": 0.0, "sha256": None,
+                                                    "encodings": [], "jobs": set()}
+            self.total_bytes += size - artifact["size"]
+            artifact["size"] = size
+            artifact["last_access"] = now
+            artifact["sha256"] = sha256
+            artifact["encodings"] = list(encodings)
+            artifact["jobs"].add(job_id)
+            self._jobs.setdefault(job_id, set()).add(name)
+            self._db.execute("INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?, ?, ?)",
+                             (name, size, now, sha256, ",".join(encodings)))
+            self._db.execute("INSERT OR IGNORE INTO artifact_jobs VALUES (?, ?)", (name, job_id))
+            self._db.commit()
+
+    def lookup(self, filename: str):
+        """Đường dẫn của artifact nếu có trong chỉ mục, không chạm tới hệ thống file."""
+        with self._lock:
+            if filename not in self._artifacts:
+                return None
+        return os.path.join(self.root, filename)
+
+    def encodings(self, filename: str) -> list:
+        """Các bản nén sẵn có của artifact, ví dụ ['br', 'gzip']."""
+        with self._lock:
+            artifact = self._artifacts.get(filename)
+            return list(artifact["encodings"]) if artifact is not None else []
+
+    def sha256(self, filename: str):
+        """Hash nội dung của artifact (dùng làm ETag); file nhận từ lần quét thì tính lần đầu được hỏi."""
+        with self._lock:
+            artifact = self._artifacts.get(filename)
+            if artifact is None:
+                return None
+            if artifact["sha256"]:
+                return artifact["sha256"]
+        sha256 = file_sha256(os.path.join(self.root, filename))
+        with self._lock:
+            if filename in self._artifacts:
+                self._artifacts[filename]["sha256"] = sha256
+                self._db.execute("UPDATE artifacts SET sha256 = ? WHERE name = ?", (sha256, filename))
+                self._db.commit()
+        return sha256
+
+    def job_artifacts(self, job_id: str) -> list:
+        with self._lock:
+            return sorted(self._jobs.get(job_id, ()))
+
+    def touch(self, filename: str):
+        with self._lock:
+            artifact = self._artifacts.get(filename)
+            if artifact is not None:
+                artifact["last_access"] = time.time()
+                self._touched.add(filename)
+
+    def forget(self, filename: str):
+        """Bỏ artifact khỏi chỉ mục khi file đã mất trên đĩa (bị xóa ngoài app hoặc bởi đợt dọn)."""
+        with self._lock:
+            if filename not in self._artifacts:
+                return
+            self._drop(filename)
+            self._db.execute("DELETE FROM artifacts WHERE name = ?", (filename,))
+            self._db.execute("DELETE FROM artifact_jobs WHERE name = ?", (filename,))
+            self._db.commit()
+
+    def _drop(self, name: str) -> dict:
+        # Gọi khi đang giữ khóa
+        artifact = self._artifacts.pop(name)
+        for job_id in artifact["jobs"]:
+            names = self._jobs.get(job_id)
+            if names is not None:
+                names.discard(name)
+                if not names:
+                    del self._jobs[job_id]
+        self._touched.discard(name)
+        self.total_bytes -= artifact["size"]
+        return artifact
+
+    def protect(self, job_id: str):
+        with self._lock:
+            self._protected.add(job_id)
+
+    def release(self, job_id: str):
+        with self._lock:
+            self._protected.discard(job_id)
+
+    def evict(self, now: float = None) -> int:
+        """Xóa artifact hết hạn rồi xóa theo LRU tới khi về dưới quota; bỏ qua file của job đang chạy.
+
+        File trong thư mục mà không có trong chỉ mục cũng bị xóa khi quá TTL.
+        """
+        now = now or time.time()
+        with self._lock:
+            candidates = sorted(
+                (a["last_access"], name) for name, a in self._artifacts.items()
+                if not a["jobs"] & self._protected
+            )
+            victims = []
+            remaining = self.total_bytes
+            for last_access, name in candidates:
+                if now - last_access <= self.ttl and remaining <= self.quota_bytes:
+                    break
+                victims.append(name)
+                remaining -= self._artifacts[name]["size"]
+
+            removed = {}
+            for name in victims:
+                artifact = removed[name] = self._drop(name)
+                self.evicted_files += 1
+                self.evicted_bytes += artifact["size"]
+
+            # Lần truy cập cuối chỉ ghi xuống đĩa theo từng đợt dọn
+            self._db.executemany("UPDATE artifacts SET last_access = ? WHERE name = ?",
+                                 [(self._artifacts[n]["last_access"], n) for n in self._touched])
+            self._touched.clear()
+            self._db.executemany("DELETE FROM artifacts WHERE name = ?", [(n,) for n in victims])
+            self._db.executemany("DELETE FROM artifact_jobs WHERE name = ?", [(n,) for n in victims])
+            self._db.commit()
+
+        for name, artifact in removed.items():
+            path = os.path.join(self.root, name)
+            for p in [path, *(variant_path(path, e) for e in artifact["encodings"])]:
+                try:
+                    os.remove(p)
+                except FileNotFoundError:
+                    pass
+        return len(victims) + self._evict_unindexed(now)
+
+    def _evict_unindexed(self, now: float) -> int:
+        # File không có trong chỉ mục (job lỗi giữa chừng, upload dở .upload_*, bản nén mồ côi) quá TTL thì xóa.
+        # File đang được ghi luôn có mtime mới nên không bị đụng tới
+        count = 0
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                with self._lock:
+                    indexed = entry.name in self._artifacts or split_variant(entry.name)[0] in self._artifacts
+                try:
+                    stat = entry.stat()
+                    if indexed or now - stat.st_mtime <= self.ttl:
+                        continue
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    continue
+                count += 1
+                with self._lock:
+                    self.evicted_files += 1
+                    self.evicted_bytes += stat.st_size
+        return count
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "files": len(self._artifacts),
+                "jobs": len(self._jobs),
+                "bytes": self.total_bytes,
+                "quota_bytes": self.quota_bytes,
+                "utilization_percent": round(self.total_bytes / self.quota_bytes * 100, 1) if self.quota_bytes else 0.0,
+                "protected_jobs": len(self._protected),
+                "evicted_files": self.evicted_files,
+                "evicted_bytes": self.evicted_bytes,
+            }
+
+
+def protect(job_id: str):
+    """Giữ file của job đang chạy ở mọi thư mục được quản lý (outputs lẫn cache)."""
+    for manager in _managers:
+        manager.protect(job_id)
+
+
+def release(job_id: str):
+    for manager in _managers:
+        manager.release(job_id)
+
+
+def evict_all() -> int:
+    return sum(manager.evict() for manager in _managers)
+
+
+storage = StorageManager()
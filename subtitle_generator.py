@@ -1,6 +1,10 @@
 import sys
-import whisper
-from deep_translator import GoogleTranslator
+from faster_whisper.audio import decode_audio
+from audio_prep import SAMPLE_RATE
+from cpu_pool import shutdown
+from long_media import CHUNK_SECONDS, is_long, transcribe_parallel
+from subtitles import srt_block
+from translation import translate_batch
 import os
 import json
 
@@ -12,9 +16,13 @@ def main():
     video_path = sys.argv[1]   
     lang = sys.argv[2] if len(sys.argv) > 2 else "vi"
 
-    # Tải model Whisper
-    model = whisper.load_model("small")
-    result = model.transcribe(video_path, verbose=False)
+    # Cùng faster-whisper với server: video dài cắt theo khoảng lặng, nhận dạng song song trên nhiều
+    # tiến trình; video ngắn là một chunk duy nhất
+    audio = decode_audio(video_path, sampling_rate=SAMPLE_RATE)
+    chunk_seconds = CHUNK_SECONDS if is_long(len(audio) / SAMPLE_RATE) else None
+    generator, _ = transcribe_parallel(audio, chunk_seconds, model_size="small")
+    result = {"segments": [{"start": start, "end": end, "text": text} for start, end, text in generator]}
+    shutdown()
 
     # Tạo file .srt cùng tên video
     base_name = os.path.splitext(os.path.basename(video_path))[0]
@@ -23,20 +31,15 @@ def main():
 
     os.makedirs("subs", exist_ok=True)
 
-    with open(srt_path, "w", encoding="utf-8") as f:
-        for i, segment in enumerate(result["segments"], start=1):
-            start = segment["start"]
-            end = segment["end"]
-            text = segment["text"]
-
-            # Dịch từng đoạn
-            translated = GoogleTranslator(source='auto', target=lang).translate(text)
+    # Dịch theo lô thay vì gọi từng đoạn
+    segments = result["segments"]
+    translations = translate_batch([segment["text"].strip() for segment in segments], lang)
 
-            # Ghi theo chuẩn SRT (song ngữ: gốc + dịch)
-            f.write(f"{i}\n")
-            f.write(f"{format_time(start)} --> {format_time(end)}\n")
-            f.write(text.strip() + "\n")         # Lời gốc
-            f.write(translated.strip() + "\n\n") # Lời dịch
+    with open(srt_path, "w", encoding="utf-8") as f:
+        for i, (segment, translated) in enumerate(zip(segments, translations), start=1):
+            # Ghi theo chuẩn SRT (song ngữ: dòng gốc + dòng dịch)
+            text = f"{segment['text'].strip()}\n{translated.strip()}"
+            f.write(srt_block(i, segment["start"], segment["end"], text))
 
     # --- trả JSON để Unity nhận ---
     response = {
@@ -45,13 +48,5 @@ def main():
     }
     print(json.dumps(response, ensure_ascii=False))
 
-def format_time(seconds: float) -> str:
-    """Chuyển giây thành định dạng SRT: hh:mm:ss,ms"""
-    hours = int(seconds // 3600)
-    minutes = int((seconds % 3600) // 60)
-    secs = int(seconds % 60)
-    millis = int((seconds % 1) * 1000)
-    return f"{hours:02}:{minutes:02}:{secs:02},{millis:03}"
-
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,135 @@
+import html
+import re
+
+# Thẻ nội tuyến của WebVTT: <00:00:01.000>, <c.color>, <b>, <i>, <u>, <v Tên>, <ruby>, <rt>, <lang en>...
+_TAG_RE = re.compile(r"</?[^>]*>")
+_TIMING_RE = re.compile(r"^\s*(\S+)\s+-->\s+(\S+)")
+# Cue ngắn hơn mức này mà chỉ lặp lại cue trước thì coi là cue chuyển tiếp
+TRANSITION_SECONDS = 0.05
+# Dòng lặp chỉ là dòng cuộn nếu cue bắt đầu ngay khi cue trước kết thúc (lệch tối đa bấy nhiêu giây)
+ROLLING_GAP_SECONDS = 0.05
+
+
+def format_time(seconds: float) -> str:
+    # Làm tròn về mili-giây trước để 2.23 không thành 00:00:02,229
+    total_ms = int(round(seconds * 1000))
+    h, rest = divmod(total_ms, 3600 * 1000)
+    m, rest = divmod(rest, 60 * 1000)
+    s, ms = divmod(rest, 1000)
+    return f"{h:02}:{m:02}:{s:02},{ms:03}"
+
+
+def parse_timestamp(value: str) -> float:
+    """'hh:mm:ss.mmm' hoặc 'mm:ss.mmm' (chấp nhận cả dấu phẩy kiểu SRT) -> giây."""
+    seconds = 0.0
+    for part in value.replace(",", ".").split(":"):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+def clean_text(line: str) -> str:
+    return html.unescape(_TAG_RE.sub("", line)).replace("\xa0", " ").strip()
+
+
+def parse_vtt(lines, keep_transitions: bool = False):
+    """Đọc WebVTT theo dòng, trả về từng cue (start, end, text) đã bỏ thẻ và dòng trống.
+
+    Cue chuyển tiếp ~10ms của phụ đề auto YouTube (chỉ lặp lại dòng cuối của cue trước) bị bỏ qua,
+    trừ khi keep_transitions (để đếm đúng số dòng gốc); lọc sau bằng drop_transitions.
+    """
+    cues = _parse_blocks(lines)
+    return cues if keep_transitions else drop_transitions(cues)
+
+
+def _parse_blocks(lines):
+    block = []
+    # Dòng chỉ có khoảng trắng vẫn thuộc cue (YouTube dùng " " làm dòng đệm), chỉ dòng rỗng mới kết thúc block
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if line:
+            block.append(line)
+            continue
+        cue = _parse_block(block)
+        block = []
+        if cue is not None:
+            yield cue
+
+    cue = _parse_block(block)
+    if cue is not None:
+        yield cue
+
+
+def drop_transitions(cues):
+    previous = None
+    for cue in cues:
+        if not _is_transition(cue, previous):
+            previous = cue
+            yield cue
+
+
+def _is_transition(cue: tuple, previous: tuple) -> bool:
+    if previous is None or cue[1] - cue[0] > TRANSITION_SECONDS:
+        return False
+    lines, previous_lines = cue[2].split("\n"), previous[2].split("\n")
+    return previous_lines[-len(lines):] == lines
+
+
+def _parse_block(block: list):
+    # Bỏ qua header WEBVTT, NOTE, STYLE, REGION và block không có dòng thời gian
+    for i, line in enumerate(block[:2]):
+        match = _TIMING_RE.match(line)
+        if match:
+            break
+    else:
+        return None
+
+    try:
+        start, end = parse_timestamp(match.group(1)), parse_timestamp(match.group(2))
+    except ValueError:
+        return None
+    text = "\n".join(t for t in (clean_text(l) for l in block[i + 1:]) if t)
+    if not text:
+        return None
+    return start, end, text
+
+
+def collapse_rolling(cues: list) -> list:
+    """Gộp dòng lặp cuộn của phụ đề auto YouTube thành các cue không chồng lấn.
+
+    Cue [A, B] rồi [B, C] -> A, B, C: dòng lặp chỉ kéo dài thời gian cue trước, dòng mới tạo cue mới.
+    Chỉ gộp khi cue nối liền cue trước; dòng lặp lại sau một khoảng nghỉ là câu nói lại thật, được giữ.
+    """
+    merged = []
+    shown, shown_end = [], None
+    for start, end, text in cues:
+        lines = text.split("\n")
+        rolling = shown_end is not None and start <= shown_end + ROLLING_GAP_SECONDS
+        k = _rolling_overlap(shown, lines) if rolling else 0
+        if k and merged:
+            merged[-1][1] = max(merged[-1][1], end)
+        if lines[k:]:
+            merged.append([start, end, "\n".join(lines[k:])])
+        shown, shown_end = lines, end
+
+    # Cue sau bắt đầu thì cue trước kết thúc
+    for current, following in zip(merged, merged[1:]):
+        if following[0] >= current[0]:
+            current[1] = min(current[1], following[0])
+    return [tuple(cue) for cue in merged]
+
+
+def _rolling_overlap(previous: list, lines: list) -> int:
+    # Số dòng đầu của cue này trùng với đuôi cue trước
+    for k in range(min(len(previous), len(lines)), 0, -1):
+        if previous[-k:] == lines[:k]:
+            return k
+    return 0
+
+
+def srt_block(index: int, start: float, end: float, text: str) -> str:
+    return f"{index}\n{format_time(start)} --> {format_time(end)}\n{text}\n\n"
+
+
+def write_srt(f, cues):
+    for i, (start, end, text) in enumerate(cues, start=1):
+        f.write(srt_block(i, start, end, text))
@@ -0,0 +1,12 @@
+import os
+import sys
+import tempfile
+
+# Các module tạo thư mục / SQLite (outputs/, cache/...) theo đường dẫn tương đối ngay lúc import:
+# chạy test trong thư mục tạm để không ghi vào cây mã nguồn
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+_workdir = tempfile.mkdtemp(prefix="subs-tests-")
+os.environ["STORAGE_INDEX_DB"] = os.path.join(_workdir, "cache", "artifacts.sqlite3")
+os.environ["TRANSLATION_CACHE_DB"] = os.path.join(_workdir, "cache", "translations.sqlite3")
+os.chdir(_workdir)
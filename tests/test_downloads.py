@@ -0,0 +1,74 @@
+import hashlib
+
+import pytest
+
+pytest.importorskip("starlette")
+
+from starlette.applications import Starlette
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from downloads import file_response, parse_range
+
+DATA = bytes(range(100))
+SHA256 = hashlib.sha256(DATA).hexdigest()
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-9", (0, 9)),
+    ("bytes=90-", (90, 99)),
+    ("bytes=95-200", (95, 99)),
+    ("bytes=-10", (90, 99)),
+    ("bytes=-200", (0, 99)),
+    ("bytes=100-", "invalid"),
+    ("bytes=-0", "invalid"),
+    ("bytes=5-2", None),
+    ("bytes=--5", None),
+    ("bytes=-", None),
+    ("bytes=a-b", None),
+    ("bytes=0-1,4-5", None),
+    ("items=0-1", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, len(DATA)) == expected
+
+
+@pytest.fixture
+def client(tmp_path):
+    path = tmp_path / "subs.srt"
+    path.write_bytes(DATA)
+
+    def download(request):
+        return file_response(request, str(path), "subs.srt", "application/x-subrip", SHA256)
+
+    return TestClient(Starlette(routes=[Route("/download", download)]))
+
+
+def test_file_response_single_range(client):
+    response = client.get("/download", headers={"range": "bytes=10-19"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == "bytes 10-19/100"
+    assert response.content == DATA[10:20]
+
+
+@pytest.mark.parametrize("header", ["bytes=5-2", "bytes=--5", "bytes=0-1,4-5"])
+def test_file_response_ignored_range_sends_full_file(client, header):
+    response = client.get("/download", headers={"range": header})
+    assert response.status_code == 200
+    assert response.content == DATA
+
+
+def test_file_response_unsatisfiable_range(client):
+    response = client.get("/download", headers={"range": "bytes=100-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == "bytes */100"
+
+
+def test_file_response_conditional(client):
+    etag = client.get("/download").headers["etag"]
+    assert etag == f'"{SHA256}"'
+    assert client.get("/download", headers={"if-none-match": etag}).status_code == 304
+    # If-Range không khớp -> trả cả file thay vì một đoạn
+    response = client.get("/download", headers={"range": "bytes=0-9", "if-range": '"other"'})
+    assert response.status_code == 200
+    assert response.content == DATA
@@ -0,0 +1,64 @@
+import threading
+import time
+
+from jobs import JobManager
+
+
+def _wait(job, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while job.finished_at is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def _blocking(gate: threading.Event):
+    def run(job, *args):
+        while not gate.wait(0.01):
+            job.check_cancelled()
+        return {}
+    return run
+
+
+def test_cancelled_job_does_not_drop_new_inflight_key():
+    manager = JobManager({"process": (2, 4)})
+    gate = threading.Event()
+    fn = _blocking(gate)
+    try:
+        first, _ = manager.submit("process", fn, key=("k",))
+        while first.started_at is None:
+            time.sleep(0.01)
+        manager.cancel(first.id)
+        second, coalesced = manager.submit("process", fn, key=("k",))
+        assert not coalesced
+        _wait(first)
+        assert first.status == "cancelled"
+
+        # Job đã hủy kết thúc sau không được xóa key của job mới
+        third, coalesced = manager.submit("process", fn, key=("k",))
+        assert coalesced and third is second
+    finally:
+        gate.set()
+        manager.shutdown()
+
+
+def test_cancel_queued_job_finishes_immediately():
+    manager = JobManager({"process": (1, 2)})
+    gate = threading.Event()
+    fn = _blocking(gate)
+    try:
+        running, _ = manager.submit("process", fn)
+        queued, _ = manager.submit("process", fn)
+        manager.cancel(queued.id)
+        assert queued.status == "cancelled"
+        assert queued.finished_at is not None
+        assert queued.cues_since(0)[1]
+        assert manager.stats()["pipelines"]["process"]["queued"] <= 1
+
+        gate.set()
+        _wait(running)
+        time.sleep(0.05)
+        # Worker lấy job đã hủy ra khỏi heap thì bỏ qua, không chạy lại
+        assert queued.started_at is None
+        assert manager.stats()["pipelines"]["process"]["queued"] == 0
+    finally:
+        gate.set()
+        manager.shutdown()
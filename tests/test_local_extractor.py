@@ -0,0 +1,63 @@
+import os
+import queue
+
+import pytest
+
+pytest.importorskip("yt_dlp")
+
+import local_extractor
+import pipeline
+import youtube
+from jobs import Job
+from storage import StorageManager
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+@pytest.fixture
+def local_subs(monkeypatch):
+    # LOCAL_SUBS_DIR được đọc lúc import -> sửa thẳng thuộc tính module, pool YoutubeDL dựng lại từ đầu
+    monkeypatch.setattr(local_extractor, "LOCAL_SUBS_DIR", FIXTURES)
+    monkeypatch.setattr(youtube, "LOCAL_SUBS_DIR", FIXTURES)
+    monkeypatch.setattr(youtube, "_idle", queue.LifoQueue())
+
+
+def test_fetch_subtitles_local(local_subs):
+    vtt = youtube.fetch_subtitles("local:demo", "en")
+    assert vtt.startswith("WEBVTT")
+    assert "good morning" in vtt
+
+
+def test_fetch_subtitles_local_missing(local_subs):
+    with pytest.raises(youtube.PipelineError):
+        youtube.fetch_subtitles("local:missing", "en")
+
+
+def test_warm_fills_pool(local_subs):
+    youtube.warm(3)
+    assert youtube._idle.qsize() == 3
+    youtube.fetch_subtitles("local:demo", "en")
+    assert youtube._idle.qsize() == 3
+
+
+def test_run_process_local(local_subs, monkeypatch, tmp_path):
+    monkeypatch.setattr(pipeline, "OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setattr(pipeline, "storage", StorageManager(
+        root=str(tmp_path), index_path=str(tmp_path / "index.sqlite3")))
+    monkeypatch.setattr(pipeline, "translate_batch", lambda texts, lang: [f"[{lang}] {t}" for t in texts])
+
+    job = Job("process")
+    result = pipeline.run_process(job, "local:demo", ["vi"])
+
+    with open(tmp_path / f"subs_{job.id}_original.srt", encoding="utf-8") as f:
+        original = f.read()
+    assert original == ("1\n00:00:00,000 --> 00:00:02,010\nhello world\n\n"
+                        "2\n00:00:02,010 --> 00:00:04,010\ngood morning\n\n"
+                        "3\n00:00:04,010 --> 00:00:06,000\nsee you soon\n\n")
+    with open(tmp_path / f"subs_{job.id}_vi.srt", encoding="utf-8") as f:
+        assert "[vi] good morning" in f.read()
+    assert result["srt_translated_urls"] == {"vi": f"/download/subs_{job.id}_vi.srt"}
+    stats = result["translation_stats"]
+    # lines_before tính cả cue chuyển tiếp 10ms của VTT gốc
+    assert (stats["vtt_cues"], stats["cues"], stats["lines_before"], stats["lines_translated"]) == (5, 3, 7, 3)
+    assert [cue["text"] for cue in job.cues] == ["hello world", "good morning", "see you soon"]
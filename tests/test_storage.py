@@ -0,0 +1,45 @@
+import os
+import time
+
+from storage import StorageManager
+
+
+def _manager(tmp_path, **kwargs):
+    root = tmp_path / "outputs"
+    root.mkdir()
+    return StorageManager(root=str(root), index_path=str(tmp_path / "index.sqlite3"), **kwargs)
+
+
+def test_forget_missing_file(tmp_path):
+    manager = _manager(tmp_path)
+    path = os.path.join(manager.root, "media_x.bin")
+    with open(path, "wb") as f:
+        f.write(b"x" * 10)
+    manager.register("job", path)
+    os.remove(path)
+
+    manager.forget("media_x.bin")
+    assert manager.lookup("media_x.bin") is None
+    assert manager.job_artifacts("job") == []
+    assert manager.stats()["bytes"] == 0
+    # Chỉ mục trên đĩa cũng đã bỏ mục này
+    assert _reopen(tmp_path).lookup("media_x.bin") is None
+
+
+def test_evict_unindexed_after_ttl(tmp_path):
+    manager = _manager(tmp_path, ttl=60)
+    old = os.path.join(manager.root, ".upload_abc")
+    fresh = os.path.join(manager.root, "subs_new_original.srt")
+    for path in (old, fresh):
+        with open(path, "w") as f:
+            f.write("x")
+    past = time.time() - 3600
+    os.utime(old, (past, past))
+
+    manager.evict()
+    assert not os.path.exists(old)
+    assert os.path.exists(fresh)
+
+
+def _reopen(tmp_path):
+    return StorageManager(root=str(tmp_path / "outputs"), index_path=str(tmp_path / "index.sqlite3"))
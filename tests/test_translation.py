@@ -0,0 +1,56 @@
+import uuid
+
+import pytest
+
+pytest.importorskip("deep_translator")
+
+import translation
+
+
+class FlakyTranslator:
+    def __init__(self, failures: int, drop_line: bool = False):
+        self.failures = failures
+        self.drop_line = drop_line
+        self.calls = []
+
+    def translate(self, text):
+        self.calls.append(text)
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("rate limited")
+        lines = [f"[vi] {line}" for line in text.split("\n")]
+        return "\n".join(lines[:-1] if self.drop_line and len(lines) > 1 else lines)
+
+
+@pytest.fixture
+def texts():
+    # Chuỗi ngẫu nhiên để không trúng cache của lần chạy khác
+    return [f"line {i} {uuid.uuid4().hex}" for i in range(50)]
+
+
+def _use(monkeypatch, translator):
+    monkeypatch.setattr(translation, "get_translator", lambda source, target: translator)
+    monkeypatch.setattr(translation, "BATCH_BACKOFF_SECONDS", 0)
+
+
+def test_batch_retried_after_error(monkeypatch, texts):
+    translator = FlakyTranslator(failures=1)
+    _use(monkeypatch, translator)
+    assert translation.translate_batch(texts, "vi") == [f"[vi] {t}" for t in texts]
+    assert len(translator.calls) == 2
+
+
+def test_batch_error_returns_originals_without_per_cue_requests(monkeypatch, texts):
+    translator = FlakyTranslator(failures=translation.BATCH_RETRIES + 1)
+    _use(monkeypatch, translator)
+    assert translation.translate_batch(texts, "vi") == texts
+    assert len(translator.calls) == translation.BATCH_RETRIES + 1
+    # Không cache bản "dịch" là nguyên văn
+    assert translation.cache.get_many(texts, "auto", "vi") == {}
+
+
+def test_line_count_mismatch_falls_back_per_cue(monkeypatch, texts):
+    translator = FlakyTranslator(failures=0, drop_line=True)
+    _use(monkeypatch, translator)
+    assert translation.translate_batch(texts[:3], "vi") == [f"[vi] {t}" for t in texts[:3]]
+    assert len(translator.calls) == 1 + 3
@@ -0,0 +1,108 @@
+import asyncio
+import os
+import subprocess
+import threading
+from collections import deque
+
+from errors import JobCancelled, PipelineError
+
+# Số tiến trình ngoài (yt-dlp, ffmpeg, ffprobe) được chạy cùng lúc
+TOOL_CONCURRENCY = int(os.environ.get("TOOL_CONCURRENCY", "4"))
+# Số dòng stderr cuối giữ lại để báo lỗi
+STDERR_TAIL_LINES = 20
+CANCEL_POLL_SECONDS = 0.2
+
+_loop = None
+_semaphore = None
+_running = 0
+_loop_lock = threading.Lock()
+
+
+class ToolTimeout(PipelineError):
+    pass
+
+
+def _event_loop() -> asyncio.AbstractEventLoop:
+    # Một event loop riêng chạy trên luồng nền: luồng job gửi lệnh vào đây, không tự chặn chờ subprocess
+    global _loop, _semaphore
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="tools", daemon=True).start()
+            _semaphore = asyncio.run_coroutine_threadsafe(_make_semaphore(), loop).result()
+            _loop = loop
+        return _loop
+
+
+async def _make_semaphore() -> asyncio.Semaphore:
+    return asyncio.Semaphore(TOOL_CONCURRENCY)
+
+
+async def _pump(stream: asyncio.StreamReader, lines: list, on_line):
+    # Đọc theo dòng ngay khi tiến trình ghi ra, không đợi tiến trình kết thúc
+    async for raw in stream:
+        line = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+        lines.append(line)
+        if on_line is not None and line:
+            on_line(line)
+
+
+async def _wait_cancel(cancel: threading.Event):
+    while not cancel.is_set():
+        await asyncio.sleep(CANCEL_POLL_SECONDS)
+
+
+async def _run(cmd: list, timeout: float, on_line, cancel: threading.Event) -> str:
+    global _running
+    name = os.path.basename(cmd[0])
+    async with _semaphore:
+        if cancel is not None and cancel.is_set():
+            raise JobCancelled(f"Đã hủy trước khi chạy {name}")
+        _running += 1
+        try:
+            return await _supervise(name, cmd, timeout, on_line, cancel)
+        finally:
+            _running -= 1
+
+
+async def _supervise(name: str, cmd: list, timeout: float, on_line, cancel: threading.Event) -> str:
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stdout, stderr = [], deque(maxlen=STDERR_TAIL_LINES)
+    pumps = asyncio.gather(_pump(proc.stdout, stdout, on_line), _pump(proc.stderr, stderr, on_line))
+    waiters = {asyncio.ensure_future(proc.wait())}
+    if cancel is not None:
+        waiters.add(asyncio.ensure_future(_wait_cancel(cancel)))
+    try:
+        done, _ = await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for waiter in waiters:
+            waiter.cancel()
+        # Quá giờ / bị hủy: kill luôn, không để tiến trình treo giữ chỗ trong pool
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        await pumps
+
+    if not done:
+        raise ToolTimeout(f"{name} chạy quá {timeout:g} giây", "\n".join(stderr))
+    if cancel is not None and cancel.is_set():
+        raise JobCancelled(f"Đã hủy khi đang chạy {name}")
+    if proc.returncode != 0:
+        raise PipelineError(f"{name} lỗi (mã {proc.returncode})", "\n".join(stderr))
+    return "\n".join(stdout)
+
+
+def run_tool(cmd: list, timeout: float, on_line=None, cancel: threading.Event = None) -> str:
+    """Chạy tiến trình ngoài qua asyncio subprocess, trả về stdout.
+
+    on_line nhận từng dòng stdout/stderr khi có (để báo tiến độ); quá timeout hoặc cancel được đặt
+    thì tiến trình bị kill. Tối đa TOOL_CONCURRENCY tiến trình chạy cùng lúc, lệnh sau phải chờ.
+    Gọi từ luồng thường (luồng job), không gọi từ trong event loop.
+    """
+    future = asyncio.run_coroutine_threadsafe(_run(cmd, timeout, on_line, cancel), _event_loop())
+    return future.result()
+
+
+def stats() -> dict:
+    return {"concurrency": TOOL_CONCURRENCY, "running": _running}
@@ -0,0 +1,149 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from deep_translator import GoogleTranslator
+from translation_cache import cache, normalize
+
+# Google giới hạn 5000 ký tự mỗi request, chừa lại một ít cho an toàn
+MAX_BATCH_CHARS = 4500
+# Ghép các cue bằng xuống dòng: Google giữ nguyên số dòng khi dịch
+SEPARATOR = "\n"
+# Số lô gửi Google song song cho /translate/batch
+TRANSLATE_CONCURRENCY = int(os.environ.get("TRANSLATE_CONCURRENCY", "8"))
+# Request cả lô lỗi (mạng, Google giới hạn tần suất) thì thử lại cả lô, chờ tăng dần giữa các lần
+BATCH_RETRIES = int(os.environ.get("TRANSLATE_BATCH_RETRIES", "2"))
+BATCH_BACKOFF_SECONDS = float(os.environ.get("TRANSLATE_BATCH_BACKOFF_SECONDS", "1"))
+
+_batch_pool = ThreadPoolExecutor(max_workers=TRANSLATE_CONCURRENCY, thread_name_prefix="translate-batch")
+# GoogleTranslator giữ tham số request trong instance nên không dùng chung giữa các luồng
+_local = threading.local()
+
+
+def get_translator(source: str, target: str) -> GoogleTranslator:
+    """Dùng lại GoogleTranslator theo (source, target) trong từng luồng thay vì tạo mới mỗi lần dịch."""
+    translators = _local.__dict__.setdefault("translators", {})
+    key = (source, target)
+    if key not in translators:
+        translators[key] = GoogleTranslator(source=source, target=target)
+    return translators[key]
+
+
+def translate_text(text: str, target: str, source: str = "auto", translator: GoogleTranslator = None) -> str:
+    """Dịch một đoạn (qua cache), lỗi thì trả về nguyên văn."""
+    if not text.strip():
+        return text
+    cached = cache.get(text, source, target)
+    if cached is not None:
+        return cached
+    return _translate_uncached(text, target, source, translator)
+
+
+def _translate_uncached(text: str, target: str, source: str, translator: GoogleTranslator = None) -> str:
+    try:
+        translator = translator or get_translator(source, target)
+        translated = translator.translate(text)
+    except Exception:
+        return text
+    if not translated:
+        return text
+    cache.put(text, translated, source, target)
+    return translated
+
+
+def make_batches(texts: list, max_chars: int = MAX_BATCH_CHARS) -> list:
+    """Chia chỉ số các cue thành từng nhóm có tổng độ dài <= max_chars."""
+    batches, current, size = [], [], 0
+    for i, text in enumerate(texts):
+        length = len(text) + len(SEPARATOR)
+        if current and size + length > max_chars:
+            batches.append(current)
+            current, size = [], 0
+        current.append(i)
+        size += length
+    if current:
+        batches.append(current)
+    return batches
+
+
+def translate_batch(texts: list, target: str, source: str = "auto", max_chars: int = MAX_BATCH_CHARS) -> list:
+    """Dịch danh sách cue theo lô, kết quả giữ đúng thứ tự đầu vào."""
+    results = list(texts)
+    # Cue rỗng giữ nguyên, cue nhiều dòng gộp về một dòng để không lệch khi tách
+    pending = [i for i, t in enumerate(texts) if t.strip()]
+    if not pending:
+        return results
+
+    # Cue đã có trong cache thì khỏi gọi mạng; cue lặp lại chỉ dịch một lần
+    known = cache.get_many([texts[i] for i in pending], source, target)
+    flat = [t for t in dict.fromkeys(normalize(texts[i]) for i in pending) if t not in known]
+
+    for batch in make_batches(flat, max_chars):
+        known.update(_translate_chunk([flat[j] for j in batch], target, source))
+
+    for i in pending:
+        results[i] = known.get(normalize(texts[i]), texts[i])
+    return results
+
+
+def _translate_chunk(chunk: list, target: str, source: str) -> dict:
+    # Một request cho cả lô; chunk là các đoạn đã chuẩn hóa, chưa có trong cache
+    translator = get_translator(source, target)
+    for attempt in range(BATCH_RETRIES + 1):
+        try:
+            translated = translator.translate(SEPARATOR.join(chunk))
+            break
+        except Exception:
+            if attempt < BATCH_RETRIES:
+                time.sleep(BATCH_BACKOFF_SECONDS * 2 ** attempt)
+    else:
+        # Upstream vẫn lỗi: trả nguyên văn, không cache, không tách thành hàng trăm request từng cue
+        return {t: t for t in chunk}
+
+    parts = [p.strip() for p in translated.split(SEPARATOR)] if translated else []
+    if len(parts) == len(chunk):
+        fresh = {t: p for t, p in zip(chunk, parts) if p}
+        cache.put_many(fresh, source, target)
+        return {t: fresh.get(t, t) for t in chunk}
+    # Số dòng trả về không khớp -> dịch lại từng cue
+    return {t: _translate_uncached(t, target, source, translator) for t in chunk}
+
+
+def translate_many(texts: list, targets: list, source: str = "auto", max_chars: int = MAX_BATCH_CHARS):
+    """Dịch nhiều đoạn sang nhiều ngôn ngữ, sinh (chỉ số, ngôn ngữ, bản dịch) ngay khi từng đoạn có kết quả.
+
+    Đoạn rỗng và đoạn đã có trong cache ra trước; đoạn lặp lại chỉ dịch một lần;
+    phần còn lại chia lô <= max_chars và dịch song song trên _batch_pool.
+    """
+    indices = {}
+    for i, text in enumerate(texts):
+        if text.strip():
+            indices.setdefault(normalize(text), []).append(i)
+        else:
+            for target in targets:
+                yield i, target, text
+
+    # Gửi hết các lô thiếu trước để chúng chạy trong lúc trả kết quả từ cache
+    futures, hits = {}, {}
+    for target in targets:
+        hits[target] = cache.get_many(list(indices), source, target)
+        misses = [key for key in indices if key not in hits[target]]
+        for batch in make_batches(misses, max_chars):
+            future = _batch_pool.submit(_translate_chunk, [misses[j] for j in batch], target, source)
+            futures[future] = target
+    for target, known in hits.items():
+        for key, translated in known.items():
+            for i in indices[key]:
+                yield i, target, translated
+
+    try:
+        for future in as_completed(futures):
+            target = futures[future]
+            for key, translated in future.result().items():
+                for i in indices[key]:
+                    yield i, target, translated
+    finally:
+        # Client ngắt stream giữa chừng thì bỏ các lô chưa chạy
+        for future in futures:
+            future.cancel()
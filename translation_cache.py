@@ -0,0 +1,136 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_DB = os.environ.get("TRANSLATION_CACHE_DB", os.path.join("cache", "translations.sqlite3"))
+MEMORY_ITEMS = int(os.environ.get("TRANSLATION_CACHE_MEMORY_ITEMS", "20000"))
+DISK_ITEMS = int(os.environ.get("TRANSLATION_CACHE_DISK_ITEMS", "1000000"))
+TTL_SECONDS = int(os.environ.get("TRANSLATION_CACHE_TTL", str(30 * 24 * 3600)))
+# Dọn bảng sau mỗi chừng này lần ghi
+PURGE_EVERY = 1000
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.split())
+
+
+class TranslationCache:
+    """Bộ nhớ dịch 2 tầng: LRU trong tiến trình + SQLite trên đĩa."""
+
+    def __init__(self, path: str = CACHE_DB, memory_items: int = MEMORY_ITEMS,
+                 disk_items: int = DISK_ITEMS, ttl: int = TTL_SECONDS):
+        self.memory_items = memory_items
+        self.disk_items = disk_items
+        self.ttl = ttl
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS translations ("
+            " source TEXT, target TEXT, text TEXT, translated TEXT,"
+            " created_at REAL, last_used REAL,"
+            " PRIMARY KEY (source, target, text))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS translations_last_used ON translations (last_used)")
+        self._db.commit()
+
+    def _remember(self, key, value, created_at):
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get_many(self, texts: list, source: str, target: str) -> dict:
+        """Trả về {text đã chuẩn hóa: bản dịch} cho các text có trong cache."""
+        found, missing = {}, []
+        keys = {normalize(t) for t in texts}
+        now = time.time()
+        with self._lock:
+            for text in keys:
+                key = (source, target, text)
+                entry = self._memory.get(key)
+                if entry and entry[1] > now - self.ttl:
+                    self._memory.move_to_end(key)
+                    found[text] = entry[0]
+                    self.hits_memory += 1
+                else:
+                    missing.append(text)
+
+            for start in range(0, len(missing), 500):
+                chunk = missing[start:start + 500]
+                rows = self._db.execute(
+                    f"SELECT text, translated, created_at FROM translations WHERE source = ? AND target = ?"
+                    f" AND created_at > ? AND text IN ({','.join('?' * len(chunk))})",
+                    [source, target, now - self.ttl, *chunk],
+                ).fetchall()
+                for text, translated, created_at in rows:
+                    found[text] = translated
+                    self._remember((source, target, text), translated, created_at)
+                    self.hits_disk += 1
+                if rows:
+                    self._db.executemany(
+                        "UPDATE translations SET last_used = ? WHERE source = ? AND target = ? AND text = ?",
+                        [(now, source, target, text) for text, _, _ in rows],
+                    )
+                    self._db.commit()
+
+            self.misses += len(keys) - len(found)
+        return found
+
+    def get(self, text: str, source: str, target: str):
+        return self.get_many([text], source, target).get(normalize(text))
+
+    def put_many(self, pairs: dict, source: str, target: str):
+        """Lưu {text gốc: bản dịch} vào cả hai tầng."""
+        if not pairs:
+            return
+        now = time.time()
+        rows = [(source, target, normalize(t), tr, now, now) for t, tr in pairs.items()]
+        with self._lock:
+            for row in rows:
+                self._remember(row[:3], row[3], now)
+            self._db.executemany("INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self._db.commit()
+            self._writes += len(rows)
+            if self._writes >= PURGE_EVERY:
+                self._writes = 0
+                self._purge(now)
+
+    def put(self, text: str, translated: str, source: str, target: str):
+        self.put_many({text: translated}, source, target)
+
+    def _purge(self, now: float):
+        # Xóa bản ghi hết hạn, rồi cắt bớt theo LRU nếu vượt quá số dòng cho phép
+        self._db.execute("DELETE FROM translations WHERE created_at <= ?", (now - self.ttl,))
+        count = self._db.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+        if count > self.disk_items:
+            self._db.execute(
+                "DELETE FROM translations WHERE rowid IN"
+                " (SELECT rowid FROM translations ORDER BY last_used LIMIT ?)",
+                (count - self.disk_items,),
+            )
+        self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits_memory + self.hits_disk + self.misses
+            return {
+                "hits_memory": self.hits_memory,
+                "hits_disk": self.hits_disk,
+                "misses": self.misses,
+                "hit_rate": round((self.hits_memory + self.hits_disk) / lookups, 4) if lookups else 0.0,
+                "memory_items": len(self._memory),
+            }
+
+
+cache = TranslationCache()
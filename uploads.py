@@ -0,0 +1,140 @@
+import asyncio
+import hashlib
+import os
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:
+    # python-multipart < 0.0.13 chỉ có tên gói cũ
+    from multipart.multipart import MultipartParser, parse_options_header
+
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", str(2 * 1024 ** 3)))
+# Trường form thường (target_lang...) chỉ là chuỗi ngắn
+MAX_FIELD_BYTES = 64 * 1024
+CHUNK_SIZE = 1024 * 1024
+_FILE = object()
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class UploadInvalid(Exception):
+    pass
+
+
+class MultipartUpload:
+    """Đọc multipart/form-data thẳng từ request.stream(), không qua bản spool của Starlette.
+
+    Phần file ghi thẳng vào dest_path, được băm sha256 và kiểm tra max_bytes ngay khi nhận nên
+    upload quá lớn bị cắt ở byte vượt ngưỡng; các trường còn lại gom vào fields ({tên: [giá trị]}).
+    """
+
+    def __init__(self, dest_path: str, file_field: str = "file", max_bytes: int = MAX_UPLOAD_BYTES):
+        self.dest_path = dest_path
+        self.file_field = file_field
+        self.max_bytes = max_bytes
+        self.fields = {}
+        self.filename = None
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self._pending = []
+        self._pending_bytes = 0
+        self._headers = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._part = None
+        self._value = bytearray()
+        self._complete = False
+
+    @property
+    def sha256(self) -> str:
+        return self._digest.hexdigest()
+
+    async def receive(self, request):
+        _, options = parse_options_header(request.headers.get("content-type", ""))
+        boundary = options.get(b"boundary")
+        if not boundary:
+            raise UploadInvalid("Cần gửi multipart/form-data")
+        parser = MultipartParser(boundary, {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+            "on_end": self._on_end,
+        })
+
+        f = await asyncio.to_thread(open, self.dest_path, "wb")
+        try:
+            async for chunk in request.stream():
+                parser.write(chunk)
+                # Gom đủ một chunk rồi mới băm + ghi ngoài event loop
+                if self._pending_bytes >= CHUNK_SIZE:
+                    await asyncio.to_thread(self._flush, f)
+            parser.finalize()
+            await asyncio.to_thread(self._flush, f)
+        except ValueError as e:
+            # MultipartParseError là ValueError: body cắt cụt hoặc sai boundary
+            raise UploadInvalid(f"multipart/form-data không hợp lệ: {e}")
+        finally:
+            await asyncio.to_thread(f.close)
+        if not self._complete:
+            raise UploadInvalid("multipart/form-data bị cắt cụt (thiếu boundary kết thúc)")
+        if self.filename is None:
+            raise UploadInvalid(f"Thiếu trường file '{self.file_field}'")
+
+    def _flush(self, f):
+        pending, self._pending, self._pending_bytes = self._pending, [], 0
+        for data in pending:
+            self._digest.update(data)
+            f.write(data)
+
+    def _on_part_begin(self):
+        self._headers = {}
+        self._value = bytearray()
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode("utf-8", errors="replace")
+        filename = options.get(b"filename")
+        if name == self.file_field and filename is not None and self.filename is None:
+            self.filename = filename.decode("utf-8", errors="replace")
+            self._part = _FILE
+        elif filename is None:
+            self._part = name
+        else:
+            # File thừa ngoài trường chính: bỏ qua
+            self._part = None
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if self._part is _FILE:
+            self.size += end - start
+            if self.size > self.max_bytes:
+                raise UploadTooLarge(f"File vượt quá giới hạn {self.max_bytes} byte")
+            self._pending.append(data[start:end])
+            self._pending_bytes += end - start
+        elif isinstance(self._part, str):
+            self._value += data[start:end]
+            if len(self._value) > MAX_FIELD_BYTES:
+                raise UploadInvalid(f"Trường '{self._part}' quá dài")
+
+    def _on_part_end(self):
+        if isinstance(self._part, str):
+            self.fields.setdefault(self._part, []).append(self._value.decode("utf-8", errors="replace"))
+        self._part = None
+
+    def _on_end(self):
+        self._complete = True
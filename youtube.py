@@ -0,0 +1,145 @@
+import os
+import queue
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from urllib.parse import parse_qs, urlparse
+
+from yt_dlp import YoutubeDL
+from yt_dlp.utils import YoutubeDLError
+
+from errors import PipelineError
+from local_extractor import LOCAL_SCHEME, LOCAL_SUBS_DIR, LocalSubtitlesIE
+
+SUB_LANG = "en"
+SUBTITLE_CACHE_DIR = os.path.join("cache", "youtube")
+SUBTITLE_TTL = int(os.environ.get("YOUTUBE_SUBTITLE_TTL", str(6 * 3600)))
+os.makedirs(SUBTITLE_CACHE_DIR, exist_ok=True)
+
+# yt-dlp chạy ngay trong tiến trình web; mạng treo quá bấy nhiêu giây thì báo lỗi
+YTDLP_SOCKET_TIMEOUT = int(os.environ.get("YTDLP_SOCKET_TIMEOUT", "30"))
+YDL_PARAMS = {
+    "quiet": True,
+    "no_warnings": True,
+    "skip_download": True,
+    "noplaylist": True,
+    "socket_timeout": YTDLP_SOCKET_TIMEOUT,
+}
+# Số lần tối đa đi theo kết quả dạng url (link trong playlist, redirect) trước khi tới video thật
+MAX_URL_RESULTS = 3
+
+# YoutubeDL không an toàn khi dùng chung giữa các luồng: mỗi lần gọi mượn riêng một instance từ pool.
+# Nạp sẵn bằng số luồng job "process" để job đầu tiên của mỗi luồng không phải dựng instance mới
+YTDLP_POOL_SIZE = int(os.environ.get("YTDLP_POOL_SIZE", os.environ.get("PROCESS_CONCURRENCY", "4")))
+_idle = queue.LifoQueue()
+
+_ID_RE = re.compile(r"^[A-Za-z0-9_-]{11}$")
+_PATH_PREFIXES = ("embed", "shorts", "live", "v", "e")
+
+
+def video_id(url: str):
+    """Lấy id video YouTube từ mọi dạng URL (watch, youtu.be, shorts, embed...)."""
+    url = url.strip()
+    if _ID_RE.match(url):
+        return url
+    if "://" not in url:
+        url = "https://" + url
+    parsed = urlparse(url)
+    host = (parsed.hostname or "").lower()
+    parts = [p for p in parsed.path.split("/") if p]
+
+    candidate = None
+    if host == "youtu.be" or host.endswith(".youtu.be"):
+        candidate = parts[0] if parts else None
+    elif host == "youtube.com" or host.endswith(".youtube.com") or host == "youtube-nocookie.com" \
+            or host.endswith(".youtube-nocookie.com"):
+        if parts[:1] == ["watch"] or not parts:
+            candidate = parse_qs(parsed.query).get("v", [None])[0]
+        elif len(parts) >= 2 and parts[0] in _PATH_PREFIXES:
+            candidate = parts[1]
+
+    return candidate if candidate and _ID_RE.match(candidate) else None
+
+
+def _cache_path(vid: str, lang: str) -> str:
+    return os.path.join(SUBTITLE_CACHE_DIR, f"{vid}_{lang}.vtt")
+
+
+def cached_subtitles(vid: str, lang: str):
+    """Đường dẫn phụ đề đã tải cho video, None nếu chưa có hoặc đã hết hạn."""
+    path = _cache_path(vid, lang)
+    try:
+        if time.time() - os.path.getmtime(path) < SUBTITLE_TTL:
+            return path
+        os.remove(path)
+    except OSError:
+        pass
+    return None
+
+
+def store_subtitles(vid: str, lang: str, vtt: str):
+    path = _cache_path(vid, lang)
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(vtt)
+    os.replace(tmp, path)
+
+
+def _create() -> YoutubeDL:
+    ydl = YoutubeDL(YDL_PARAMS)
+    if LOCAL_SUBS_DIR:
+        ydl.add_info_extractor(LocalSubtitlesIE())
+    return ydl
+
+
+@contextmanager
+def _checkout():
+    # Pool hết instance rảnh (nhiều luồng hơn YTDLP_POOL_SIZE) thì dựng thêm, trả lại pool sau khi dùng
+    try:
+        ydl = _idle.get_nowait()
+    except queue.Empty:
+        ydl = _create()
+    try:
+        yield ydl
+    finally:
+        _idle.put(ydl)
+
+
+def warm(count: int = YTDLP_POOL_SIZE):
+    """Dựng sẵn các instance YoutubeDL (import yt-dlp, nạp extractor) lúc khởi động cho mọi luồng job."""
+    for _ in range(count - _idle.qsize()):
+        _idle.put(_create())
+
+
+def fetch_subtitles(url: str, lang: str = SUB_LANG) -> str:
+    """Lấy nội dung phụ đề auto (WebVTT) của video thẳng vào bộ nhớ bằng yt-dlp trong tiến trình."""
+    # GenericIE nhận mọi URL nên extractor thay thế phải được chỉ định rõ
+    ie_key = LocalSubtitlesIE.ie_key() if LOCAL_SUBS_DIR and url.startswith(LOCAL_SCHEME) else None
+    vid = None if ie_key else video_id(url)
+    if vid:
+        # Bỏ list=... và tham số thừa: link trong playlist trả về kết quả url trần, không có phụ đề
+        url = f"https://www.youtube.com/watch?v={vid}"
+    with _checkout() as ydl:
+        return _extract_subtitles(ydl, url, ie_key, lang)
+
+
+def _extract_subtitles(ydl: YoutubeDL, url: str, ie_key, lang: str) -> str:
+    try:
+        # process=False: chỉ cần metadata thô, bỏ qua bước chọn định dạng video
+        info = ydl.extract_info(url, download=False, ie_key=ie_key, process=False)
+        for _ in range(MAX_URL_RESULTS):
+            # process=False không tự đi theo kết quả url/url_transparent -> tự giải quyết tới video
+            if info.get("_type") not in ("url", "url_transparent"):
+                break
+            info = ydl.extract_info(info["url"], download=False, ie_key=info.get("ie_key"), process=False)
+        tracks = (info.get("automatic_captions") or {}).get(lang) or []
+        track = next((t for t in tracks if t.get("ext") == "vtt"), None)
+        if track is None:
+            raise PipelineError("Video không có phụ đề auto")
+        if "data" in track:
+            return track["data"]
+        with ydl.urlopen(track["url"]) as response:
+            return response.read().decode("utf-8")
+    except (YoutubeDLError, OSError) as e:
+        raise PipelineError("Không lấy được phụ đề từ YouTube", str(e))